@@ -37,7 +37,17 @@ TOLERANCE_CONFIG_PATH = USER_FILES_DIR / "tolerance_config.json"
 
 # --- Initialize Managers ---
 # TemplateManagerWin32 expects base_user_dir to be where 'templates_map.db' and 'templates/' subdir reside
-template_manager = TemplateManagerWin32(base_user_dir=USER_FILES_DIR)
+@st.cache_resource
+def get_template_manager(base_user_dir: Path) -> TemplateManagerWin32:
+    """Creates the manager once per server process, so its template cache survives script reruns."""
+    return TemplateManagerWin32(base_user_dir=base_user_dir)
+
+@st.cache_data(ttl=5)
+def list_templates_cached(_manager: TemplateManagerWin32) -> list:
+    """(id, name) pairs for the selector; refreshed at most every few seconds instead of on every rerun."""
+    return _manager.list_selectable_templates_light()
+
+template_manager = get_template_manager(USER_FILES_DIR)
 
 
 # --- Helper Functions ---
@@ -71,14 +81,14 @@ ensure_tolerance_config_exists()
 # st.sidebar.header("操作面板")
 uploaded_file = st.file_uploader("1. 上传 Word 文档 (.docx)", type=["docx"], key="file_uploader")
 
-available_templates = template_manager.list_selectable_templates()
+available_templates = list_templates_cached(template_manager)
 if not available_templates:
     st.warning("系统中暂无可用模板。请先通过“create template”页面添加模板。")
     # Link to create_template page if it exists
     # st.page_link("pages/create_template.py", label="前往创建模板", icon="➕")
     st.stop()
 
-template_options = {tpl['name']: tpl['id'] for tpl in available_templates}
+template_options = {name: tpl_id for tpl_id, name in available_templates}
 selected_template_name = st.selectbox(
     "2. 选择一个样式模板",
     options=template_options.keys(),
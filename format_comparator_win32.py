@@ -83,10 +83,9 @@ class FormatComparatorWin32:
         # Template name should also be sourced from the top level of template_data.
         self.template_name = self.template_data.get("name", "未命名模板")
 
-        # Since prefix is removed, unprefixed_target_styles is a direct copy of target_styles.
-        # Or, subsequent code could be refactored to use self.target_styles directly.
-        # For now, maintain the structure by copying.
-        self.unprefixed_target_styles = self.target_styles.copy()
+        # Since prefix is removed, unprefixed_target_styles is the same mapping as target_styles.
+        # It is only read, so share it by reference instead of copying.
+        self.unprefixed_target_styles = self.target_styles
         
         self.tolerance_config = self._load_tolerance_config(tolerance_config_path)
         self.differences: List[Dict[str, Any]] = []
@@ -105,9 +104,10 @@ class FormatComparatorWin32:
         self.template_manager_for_llm = TemplateManagerWin32(base_user_dir=user_files_base_dir)
         self.mapper_generator: Optional[LLMStyleMapper] = None
         if self.llm_client:
+            # No clients passed: the mapper reuses the shared sync client and opens
+            # a fresh async client inside each run's event loop for batched calls.
             self.mapper_generator = LLMStyleMapper(
                 template_manager=self.template_manager_for_llm,
-                llm_client=self.llm_client,
                 template_data=self.template_data # Pass the already loaded template_data
             )
             print("LLMStyleMapper (win32com) initialized.")
@@ -392,7 +392,7 @@ class FormatComparatorWin32:
         if style_name: # P1: Explicit style name match
             print(f"[DEBUG P1] style_name: '{style_name}', Attempting match in unprefixed_target_styles.")
             # Since self.prefix is removed, unprefixed_style_name is just style_name.
-            # self.unprefixed_target_styles is now a copy of self.target_styles.
+            # self.unprefixed_target_styles is the same dict as self.target_styles.
             if style_name in self.unprefixed_target_styles:
                 target_style_info = self.unprefixed_target_styles[style_name]
                 target_style_name = style_name
@@ -566,9 +566,7 @@ class FormatComparatorWin32:
             target_font_style_for_size = target_style_info.get("字体", {})
             template_font_size_config = target_font_style_for_size.get("大小")
             if template_font_size_config:
-                val_fs, unit_fs = self.unit_converter.parse_value(template_font_size_config)
-                if val_fs is not None:
-                    _template_font_size_pt_for_indent = self.unit_converter.convert_value(value=val_fs, from_unit=unit_fs, to_unit='pt')
+                _template_font_size_pt_for_indent = self.unit_converter.fast_to_pt(template_font_size_config)
 
             target_para_template = target_style_info.get("段落", {})
             if target_para_template:
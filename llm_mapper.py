@@ -1,11 +1,41 @@
+from __future__ import annotations # 类型注解延迟求值，pandas 仅在类型检查时导入
+
 import os
 import re
 import json
 import ast  # 添加此导入用于解析Python字面量
-from typing import List, Dict, Any, Optional, Union, Tuple
-from openai import OpenAI, Timeout, APITimeoutError # 导入 APITimeoutError
+import asyncio
+import difflib
+import functools
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Union, Tuple
 import logging # 导入日志模块
-import pandas as pd # Added for type hinting
+# openai / pandas / rapidfuzz 导入开销较大，改为在首次使用时导入以加快冷启动
+if TYPE_CHECKING:
+    import pandas as pd # Type hints only
+
+# orjson 解析/序列化速度明显快于标准库 json；未安装时回退到 json
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    _HAS_ORJSON = False
+
+# rapidfuzz (C++ 实现) 用于 LLM 样式名模糊匹配；首次使用时导入，未安装时改用标准库 difflib.get_close_matches（相似度阈值 0.75）
+_rapidfuzz_modules = None # None: 尚未尝试导入; False: 不可用; 否则为 (fuzz, process)
+
+def _get_rapidfuzz():
+    """惰性导入 rapidfuzz，结果缓存在模块级单例中。不可用时返回 None。"""
+    global _rapidfuzz_modules
+    if _rapidfuzz_modules is None:
+        try:
+            from rapidfuzz import fuzz, process
+            _rapidfuzz_modules = (fuzz, process)
+        except ImportError:
+            _rapidfuzz_modules = False
+    return _rapidfuzz_modules or None
 
 # --- 配置日志记录器 ---
 # Changed logger name slightly for clarity and to avoid conflicts if root logger is used elsewhere
@@ -15,7 +45,7 @@ if not logger.hasHandlers():
     logger.setLevel(logging.WARNING) # 设置日志级别
     # 创建文件处理器，指定文件名和编码
     # Log file will be created in the win32com directory as llm_mapper.py is there
-    file_handler = logging.FileHandler('llm_parsing_errors.log', encoding='utf-8')
+    file_handler = logging.FileHandler('llm_parsing_errors.log', encoding='utf-8', delay=True) # 首次写日志时才创建文件
     # 创建日志格式器
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     # 将格式器添加到处理器
@@ -24,10 +54,92 @@ if not logger.hasHandlers():
     logger.addHandler(file_handler)
 # --- 日志配置结束 ---
 
+# LLM 响应中的一行映射: "索引,样式名"（允许两侧的水平空白和 \r）
+_LLM_LINE_RE = re.compile(r'^[^\S\n]*(\d+)[^\S\n]*,[^\S\n]*(\S[^\r\n]*?)[^\S\n]*$', re.MULTILINE)
+_NON_BLANK_LINE_RE = re.compile(r'^[^\S\n]*\S', re.MULTILINE)
+# 将中文数字标题名规范为模板中使用的阿拉伯数字形式
+_CHINESE_TITLE_MAP = {"标题一": "标题1", "标题二": "标题2", "标题三": "标题3"}
+# 段落预处理规则：数字编号标题 / 符号列表项 / 编号列表项 / 引用
+_HEADING_RE = re.compile(r'^(\d+(\.\d+)*)\s+(.+)$')
+# 可视为高置信度标题的编号段落：每级编号至多两位且以空白分隔、整行较短、不含句读标点
+# （排除 "2023 年，公司……" 这类以数字开头的正文句子）
+_HIGH_CONFIDENCE_HEADING_RE = re.compile(r'^\d{1,2}(?:\.\d{1,2})*\s+[^。，；：！？,;:!?]+$')
+_HIGH_CONFIDENCE_HEADING_MAX_LEN = 40
+_BULLET_RE = re.compile(r'^[•\-*]\s+(.+)$')
+_ENUM_RE = re.compile(r'^(\d+|[a-zA-Z]+|[ivxIVX]+)[\.、\)）]\s+(.+)$')
+_QUOTE_RE = re.compile(r'^[>》]\s*(.+)$')
+_BULLET_FIRST_CHARS = ('•', '-', '*')
+_QUOTE_FIRST_CHARS = ('>', '》')
+
+# system prompt 中的输出格式说明（逐行 CSV，默认）
+_CSV_OUTPUT_INSTRUCTIONS = """**输出格式要求：**
+请严格按照以下格式输出每一对映射关系，**每对占一行**：
+`段落索引号,样式名称`
+
+例如：
+`0,标题一`
+`6,正文`
+`7,正文`
+`23,图题`
+
+**重要提示：**
+- **不要**包含任何额外的括号、引号、分号、Markdown 标记 (如 ```) 或其他任何无关字符。
+- **确保**只输出索引号、一个英文逗号、样式名称和换行符。
+- **必须**为你收到的**每一个**段落（及其对应的原始 `idx`）都输出一行对应的映射。"""
+
+# 结构化输出 (response_format 为 json_object / json_schema) 时的输出格式说明
+_JSON_OUTPUT_INSTRUCTIONS = """**输出格式要求：**
+请输出一个 JSON 对象，格式如下：
+{"mappings": [{"idx": 段落索引号, "style": "样式名称"}, ...]}
+
+例如：
+{"mappings": [{"idx": 0, "style": "标题一"}, {"idx": 6, "style": "正文"}, {"idx": 23, "style": "图题"}]}
+
+**重要提示：**
+- `idx` 必须是整数，`style` 必须是样式名称字符串。
+- **不要**输出 JSON 对象以外的任何内容（包括 Markdown 标记）。
+- **必须**为你收到的**每一个**段落（及其对应的原始 `idx`）都在 `mappings` 中给出一项对应的映射。"""
+
+# response_format.type == "json_schema" 时约束模型输出的 JSON Schema
+_STYLE_MAPPING_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "mappings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "idx": {"type": "integer"},
+                    "style": {"type": "string"}
+                },
+                "required": ["idx", "style"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["mappings"],
+    "additionalProperties": False
+}
+
+def _load_json_file(path: str) -> Any:
+    """读取并解析 JSON 文件（优先使用 orjson）"""
+    if _HAS_ORJSON:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+@functools.lru_cache(maxsize=1)
 def load_config():
     """
     从配置文件加载设置 (win32com version)
+
+    llm.model 建议使用支持前缀缓存 (prefix caching) 的 DeepSeek 模型（如 deepseek-chat）：
+    各批次请求共享完全相同的 system prompt，服务端可复用其 KV 缓存，显著降低首 token 延迟。
+    llm.prefix_cache_warmup 为 true 时，会在并发发送批次前先用 system prompt 发一次极小的预热请求。
     
+    结果经 lru_cache 缓存，进程内重复调用不会再次读取和解析配置文件。
+
     Returns:
         Dict: 配置信息
     """
@@ -36,14 +148,12 @@ def load_config():
     example_config_path = os.path.join(current_dir, "config_example.json")
     
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return _load_json_file(config_path)
     except FileNotFoundError:
         try:
-            with open(example_config_path, "r", encoding="utf-8") as f:
-                config_data = json.load(f)
-                print(f"警告: 使用示例配置文件 ({example_config_path})。请创建 {config_path} 并填入您的 API 密钥。")
-                return config_data
+            config_data = _load_json_file(example_config_path)
+            print(f"警告: 使用示例配置文件 ({example_config_path})。请创建 {config_path} 并填入您的 API 密钥。")
+            return config_data
         except FileNotFoundError:
             print(f"警告: 找不到配置文件 ({config_path} 或 {example_config_path})，使用默认配置。")
             return {
@@ -69,29 +179,116 @@ def load_config():
             }
         }
 
-# 加载主配置
-config = load_config()
 
 # 创建 OpenAI 客户端实例
+def _http_client_kwargs() -> Dict[str, Any]:
+    """
+    共享 httpx 连接池的参数：保持长连接，已安装 h2 时启用 HTTP/2 多路复用，
+    让并发批次共用同一条连接。
+    """
+    import httpx
+    from importlib.util import find_spec
+
+    return {
+        "http2": find_spec("h2") is not None,
+        "limits": httpx.Limits(max_keepalive_connections=20, max_connections=50),
+    }
+
+def _has_usable_api_key(api_key: Optional[str]) -> bool:
+    """API 密钥未配置或仍为占位符时给出提示并返回 False。"""
+    # More robust check for placeholder API keys
+    if not api_key or api_key.startswith("<YOUR_") or api_key == "<DeepSeek API Key>":
+        # Construct the expected path to config.json within the win32com directory
+        expected_config_path = os.path.join(os.path.dirname(__file__), 'config.json')
+        print(f"警告: 请在 {expected_config_path} 中设置您的 API 密钥 (llm.api_key)")
+        return False
+    return True
+
+@functools.lru_cache(maxsize=1)
 def create_llm_client(): # Name kept as per plan
     """
-    根据配置创建 LLM 客户端 (win32com version)
+    根据配置创建 LLM 客户端 (win32com version)。
+    进程内只创建一次，所有调用方共享同一个连接池。
     
     Returns:
         OpenAI: LLM 客户端实例
     """
-    llm_config = config.get("llm", {})
+    llm_config = load_config().get("llm", {})
     api_key = llm_config.get("api_key")
     base_url = llm_config.get("base_url")
     
-    # More robust check for placeholder API keys
-    if not api_key or api_key.startswith("<YOUR_") or api_key == "<DeepSeek API Key>":
-        # Construct the expected path to config.json within the win32com directory
-        expected_config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-        print(f"警告: 请在 {expected_config_path} 中设置您的 API 密钥 (llm.api_key)")
+    if not _has_usable_api_key(api_key):
         return None
     
-    return OpenAI(api_key=api_key, base_url=base_url)
+    from openai import OpenAI, DefaultHttpxClient
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=DefaultHttpxClient(**_http_client_kwargs()))
+
+def create_async_llm_client():
+    """
+    根据配置创建异步 LLM 客户端，用于分批并发调用 (win32com version)。
+    异步连接池绑定在创建它的事件循环上，而 generate_mapping 每次都通过 asyncio.run 新建事件循环，
+    因此不做缓存：每次调用都返回新实例，由调用方在同一个事件循环内使用并关闭。
+    
+    Returns:
+        AsyncOpenAI: 异步 LLM 客户端实例
+    """
+    llm_config = load_config().get("llm", {})
+    api_key = llm_config.get("api_key")
+    base_url = llm_config.get("base_url")
+    
+    if not _has_usable_api_key(api_key):
+        return None
+    
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=DefaultAsyncHttpxClient(**_http_client_kwargs()))
+
+class _StreamCollector:
+    """
+    累积流式响应的增量文本。CSV 模式下对已完整到达的行逐行校验：
+    在出现第一行有效映射之前，若连续多行都无法解析，则提前中止，避免等待整段无效输出。
+    """
+
+    def __init__(self, check_lines: bool, max_invalid_lines: int):
+        self._parts: List[str] = []
+        self._pending = "" # 尚未遇到换行符的不完整行
+        self._check_lines = check_lines
+        self._max_invalid_lines = max_invalid_lines
+        self._invalid_lines = 0
+        self.finish_reason: Optional[str] = None # 最后一个 chunk 给出的结束原因
+
+    def feed(self, chunk) -> None:
+        """处理一个流式 chunk"""
+        if not chunk.choices:
+            return
+        finish_reason = getattr(chunk.choices[0], "finish_reason", None)
+        if finish_reason:
+            self.finish_reason = finish_reason
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            return
+        self._parts.append(delta)
+        if not self._check_lines:
+            return
+        self._pending += delta
+        while self._check_lines and '\n' in self._pending:
+            line, self._pending = self._pending.split('\n', 1)
+            self._check_line(line)
+
+    def _check_line(self, line: str) -> None:
+        stripped = line.strip()
+        if not stripped or stripped.startswith('```'):
+            return
+        if _LLM_LINE_RE.match(line):
+            # 已出现有效映射，其余行交给 _parse_llm_response 统一解析
+            self._check_lines = False
+            self._pending = ""
+            return
+        self._invalid_lines += 1
+        if self._invalid_lines >= self._max_invalid_lines:
+            raise RuntimeError(f"流式响应的前 {self._invalid_lines} 行均不是 '索引,样式名' 格式，提前中止。")
+
+    def content(self) -> str:
+        return "".join(self._parts)
 
 class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
     """
@@ -100,13 +297,41 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
     该类使用大型语言模型（LLM）分析 Word 文档内容，
     自动生成段落样式映射，提高样式应用的效率和准确性。
     """
-    def __init__(self, template_manager, llm_client=None, split_titles: Optional[List[str]] = None, template_data: Optional[dict] = None):
+    DEFAULT_BATCH_SIZE = 80 # 每个 LLM 请求包含的段落数
+    DEFAULT_MAX_CONCURRENCY = 8 # 同时进行的 LLM 请求上限，避免触发服务商 QPS 限制
+    STREAM_MAX_INVALID_LINES = 5 # 流式响应开头连续多少行无法解析时中止该请求
+
+    def __init__(self, template_manager, llm_client=None, split_titles: Optional[List[str]] = None, template_data: Optional[dict] = None, async_llm_client=None):
         """初始化样式映射生成器 (win32com version)"""
         self.template_manager = template_manager # This will be TemplateManagerWin32 instance
+        if llm_client is None and async_llm_client is None:
+            # 未显式传入客户端时使用模块级共享客户端（未配置 API 密钥时仍为 None）
+            # 异步客户端不在此创建，而是在每次 _gather_llm_responses 的事件循环内新建并关闭
+            llm_client = create_llm_client()
+            self._create_async_client_per_run = llm_client is not None
+        else:
+            self._create_async_client_per_run = False
         self.llm_client = llm_client
-        self.config = config
+        self.async_llm_client = async_llm_client # Caller-owned async client; used for concurrent batched calls when given
+        self.config = load_config() # 首次使用时读取配置，导入模块时不做文件 I/O
+        llm_params = self.config.get("llm", {})
+        self.batch_size = max(1, int(llm_params.get("batch_size", self.DEFAULT_BATCH_SIZE)))
+        self.max_concurrency = max(1, int(llm_params.get("max_concurrency", self.DEFAULT_MAX_CONCURRENCY)))
+        self.prefix_cache_warmup = bool(llm_params.get("prefix_cache_warmup", False))
+        # 流式接收响应：边生成边校验，输出明显异常时可提前中止并重试
+        self.stream = bool(llm_params.get("stream", True))
+        # 规则高置信度识别的段落（数字编号标题）是否跳过 LLM；默认关闭，需在配置中显式开启
+        self.skip_high_confidence = bool(llm_params.get("skip_high_confidence", False))
+        # 响应缓存：相同 (model, system, user) 的请求直接复用磁盘上的结果，仅在低温度（确定性输出）时启用
+        self.response_cache_enabled = bool(llm_params.get("response_cache", True))
+        self.response_cache_dir = llm_params.get("response_cache_dir") or os.path.join(os.path.dirname(__file__), "user_files", "llm_cache")
         self.split_titles = split_titles if split_titles is not None else []
         self.template_data = template_data
+        self._cached_system_prompt: Optional[str] = None # Frozen once per generate_mapping call
+        self._parsed_template_cache = None # (template_data object, parsed styles tuple), see _parse_template_styles
+        if template_data:
+            # 预先解析模板样式（名称集合、回退样式、模糊匹配索引），映射时直接复用
+            self._parse_template_styles(template_data, template_data.get("name", ""))
 
     # Note: _segment_document, _find_title_indices_in_body might not be directly used
     # if generate_mapping directly receives a filtered doc_df.
@@ -115,9 +340,9 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
     def _is_title_match(self, paragraph_text: str, config_title: str) -> bool:
         """
         检查段落文本是否匹配配置的标题，使用文本规范化和增强的正则表达式。
-        (win32com version - uses normalize_text from .utils)
+        (win32com version - uses normalize_text from utils)
         """
-        from .utils import normalize_text # Relative import for win32com
+        from utils import normalize_text
         normalized_para_text = normalize_text(paragraph_text)
         normalized_config_title = normalize_text(config_title)
 
@@ -147,45 +372,64 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
         Returns:
             List of dictionaries with 'idx' and 'text'.
         """
-        paragraphs = []
         if 'paragraph_index' not in doc_df.columns or 'text' not in doc_df.columns:
             # Log this error or raise a more specific one if critical
             print("错误: _extract_paragraphs_from_df 期望的 DataFrame 缺少 'paragraph_index' 或 'text' 列。")
             return [] # Return empty list to prevent further errors downstream
-            
-        for _, row in doc_df.iterrows():
-            paragraphs.append({
-                "idx": row['paragraph_index'],
-                "text": str(row['text']) # Ensure text is string
-            })
-        return paragraphs
+
+        # Column-wise zip avoids building a Series per row as iterrows() does
+        return [
+            {"idx": idx, "text": str(text)} # Ensure text is string
+            for idx, text in zip(doc_df['paragraph_index'].tolist(), doc_df['text'].tolist())
+        ]
     
-    def _preprocess_paragraphs(self, paragraphs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _preprocess_paragraphs(self, paragraphs: Union[pd.DataFrame, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
         """
-        对段落进行预处理，识别明显的格式特征并生成初步样式建议
+        对段落进行预处理，识别明显的格式特征并生成初步样式建议。
+        带建议的段落同时标注 confidence："high"（短小、无句读标点的数字编号标题）或 "medium"（其余编号段落、列表项、引用）。
+        可直接传入含 'paragraph_index' 和 'text' 列的 DataFrame，按列读取而不逐行构建字典。
         """
+        if hasattr(paragraphs, 'columns'):
+            if 'paragraph_index' not in paragraphs.columns or 'text' not in paragraphs.columns:
+                print("错误: _preprocess_paragraphs 期望的 DataFrame 缺少 'paragraph_index' 或 'text' 列。")
+                return []
+            pairs = zip(paragraphs['paragraph_index'].tolist(), paragraphs['text'].tolist())
+        else:
+            pairs = ((para["idx"], para["text"]) for para in paragraphs)
+
         processed = []
-        for para in paragraphs:
-            idx = para["idx"]
-            text = str(para["text"]) # Ensure text is string
+        for idx, text in pairs:
+            text = str(text) # Ensure text is string
             result = {"idx": idx, "text": text}
-            
-            heading_match = re.match(r'^(\d+(\.\d+)*)\s+(.+)$', text)
-            if heading_match:
-                number = heading_match.group(1)
-                level = number.count('.') + 1
-                if level == 1: result["suggestion"] = "标题一"
-                elif level == 2: result["suggestion"] = "标题二"
-                elif level >= 3: result["suggestion"] = "标题三"
-            elif re.match(r'^[•\-*]\s+(.+)$', text): result["suggestion"] = "列表项"
-            elif re.match(r'^(\d+|[a-zA-Z]+|[ivxIVX]+)[\.、\)）]\s+(.+)$', text): result["suggestion"] = "列表项"
-            elif re.match(r'^[>》]\s*(.+)$', text) or text.startswith('"') and text.endswith('"'): result["suggestion"] = "引用"
             processed.append(result)
+
+            # 先按首字符分派，只尝试可能匹配的规则；大部分正文段落（汉字开头）无需任何正则
+            first = text[:1]
+            if first.isdigit():
+                heading_match = _HEADING_RE.match(text)
+                if heading_match:
+                    number = heading_match.group(1)
+                    level = number.count('.') + 1
+                    if level == 1: result["suggestion"] = "标题一"
+                    elif level == 2: result["suggestion"] = "标题二"
+                    elif level >= 3: result["suggestion"] = "标题三"
+                    is_short_heading = len(text) <= _HIGH_CONFIDENCE_HEADING_MAX_LEN and _HIGH_CONFIDENCE_HEADING_RE.match(text)
+                    result["confidence"] = "high" if is_short_heading else "medium"
+                elif _ENUM_RE.match(text): result["suggestion"] = "列表项"; result["confidence"] = "medium"
+            elif first in _BULLET_FIRST_CHARS:
+                if _BULLET_RE.match(text): result["suggestion"] = "列表项"; result["confidence"] = "medium"
+            elif first in _QUOTE_FIRST_CHARS:
+                if _QUOTE_RE.match(text): result["suggestion"] = "引用"; result["confidence"] = "medium"
+            elif first == '"':
+                if text.endswith('"'): result["suggestion"] = "引用"; result["confidence"] = "medium"
+            elif first.isascii() and first.isalpha():
+                if _ENUM_RE.match(text): result["suggestion"] = "列表项"; result["confidence"] = "medium"
         return processed
-    
-    def _build_llm_prompt(self, paragraphs: List[Dict[str, Any]], template_styles: Optional[List[str]] = None) -> Dict[str, Any]:
+
+    def _build_system_prompt(self, template_styles: Optional[List[str]] = None) -> str:
         """
-        构建发送给 LLM 的 Prompt
+        构建 system prompt。内容只依赖模板样式列表，同一次 generate_mapping 的所有批次共享，
+        以便命中服务端的前缀缓存。
         """
         system_prompt = """你是一个专业的论文文档样式分析助手。你会收到一个 JSON 列表，其中每个对象代表原始文档中的一个**非空文本段落**。每个对象包含：
 - `idx`: 该段落在**原始完整文档**中的**绝对索引号**（从0开始计数）。请注意，由于只发送了非空段落，这些 `idx` **可能不是连续的**。
@@ -215,32 +459,174 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
 - 对于包含 `suggestion` 的段落：请将该建议作为重要参考，结合上下文语义进行验证。如果建议合理，请采纳；如果认为建议不准确，请根据你的判断给出更合适的样式。
 - 对于不包含 `suggestion` 的段落：请完全基于文本内容和上下文语义进行判断。
 
-**输出格式要求：**
-请严格按照以下格式输出每一对映射关系，**每对占一行**：
-`段落索引号,样式名称`
-
-例如：
-`0,标题一`
-`6,正文`
-`7,正文`
-`23,图题`
-
-**重要提示：**
-- **不要**包含任何额外的括号、引号、分号、Markdown 标记 (如 ```) 或其他任何无关字符。
-- **确保**只输出索引号、一个英文逗号、样式名称和换行符。
-- **必须**为你收到的**每一个**段落（及其对应的原始 `idx`）都输出一行对应的映射。"""
+"""
+        # 输出格式说明：结构化输出模式下要求 JSON 对象，否则为逐行 CSV
+        system_prompt += _JSON_OUTPUT_INSTRUCTIONS if self._structured_output_mode() else _CSV_OUTPUT_INSTRUCTIONS
 
         if template_styles: # template_styles are unprefixed names
             style_list_str = ", ".join(sorted(list(set(template_styles)))) # Ensure unique and sorted for consistency
             system_prompt += f"\n\n请注意，你主要应该从以下模板样式列表中选择：{style_list_str}。如果这些样式都不适用，可以考虑上述通用样式类型。"
+        return system_prompt
+
+    def _build_llm_prompt(self, paragraphs: List[Dict[str, Any]], template_styles: Optional[List[str]] = None, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """
+        构建发送给 LLM 的 Prompt。传入 system_prompt 时直接复用（保证各批次前缀一致），
+        只有段落 JSON 作为可变的 user 内容。
+        """
+        if system_prompt is None:
+            system_prompt = self._build_system_prompt(template_styles)
         
-        user_prompt = json.dumps(paragraphs, ensure_ascii=False, indent=2)
+        # Compact JSON: indentation only adds prompt tokens the model has to prefill
+        if _HAS_ORJSON:
+            user_prompt = orjson.dumps(paragraphs, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        else:
+            user_prompt = json.dumps(paragraphs, ensure_ascii=False, separators=(',', ':'))
         
         return {
             "system": system_prompt,
             "user": user_prompt
         }
     
+    def _build_request_params(self, prompt: Dict[str, Any], timeout: int, stream: bool = False) -> Dict[str, Any]:
+        """构建 chat.completions.create 的请求参数（同步与异步调用共用）"""
+        from openai import Timeout
+        llm_params = self.config.get("llm", {})
+        params = {
+            "model": llm_params.get("model", "deepseek-chat"),
+            "messages": [
+                {"role": "system", "content": prompt["system"]},
+                {"role": "user", "content": prompt["user"]}
+            ],
+            "max_tokens": llm_params.get("max_tokens", 4096), # Increased default
+            "top_p": llm_params.get("top_p", 0.7), # Example value, can be configured
+            "temperature": llm_params.get("temperature", 0.1), # Example value for more deterministic output
+            "timeout": Timeout(float(timeout))
+        }
+        response_format = self._response_format_param()
+        if response_format:
+            params["response_format"] = response_format
+        if stream:
+            params["stream"] = True
+        return params
+
+    def _structured_output_mode(self) -> Optional[str]:
+        """配置的 llm.response_format.type 为 json_object / json_schema 时返回该类型，否则返回 None（CSV 文本模式）"""
+        response_format = self.config.get("llm", {}).get("response_format") or {}
+        format_type = response_format.get("type") if isinstance(response_format, dict) else None
+        return format_type if format_type in ("json_object", "json_schema") else None
+
+    def _response_format_param(self) -> Optional[Dict[str, Any]]:
+        """构建请求的 response_format 参数；json_schema 模式下未配置 schema 时使用内置的样式映射 schema"""
+        mode = self._structured_output_mode()
+        if mode == "json_object":
+            return {"type": "json_object"}
+        if mode == "json_schema":
+            json_schema = self.config["llm"]["response_format"].get("json_schema") or {
+                "name": "style_mapping", "schema": _STYLE_MAPPING_JSON_SCHEMA, "strict": True
+            }
+            return {"type": "json_schema", "json_schema": json_schema}
+        return None
+
+    def _extract_response_content(self, response) -> str:
+        """从 API 响应中取出文本内容"""
+        if isinstance(response, str):
+            # Log the first 500 characters of the unexpected string response
+            unexpected_response_preview = response[:500]
+            error_message = f"LLM API returned an unexpected string response. Preview: {unexpected_response_preview}"
+            print(f"错误: {error_message}") # Log for immediate visibility
+            raise RuntimeError(error_message) # Raise a more specific error
+        return response.choices[0].message.content
+
+    @staticmethod
+    def _extract_finish_reason(response) -> Optional[str]:
+        """从非流式 API 响应中取出 finish_reason"""
+        return getattr(response.choices[0], "finish_reason", None)
+
+    def _new_stream_collector(self) -> _StreamCollector:
+        # 结构化输出 (JSON) 不是逐行格式，只累积文本不做逐行校验
+        return _StreamCollector(check_lines=self._structured_output_mode() is None,
+                                max_invalid_lines=self.STREAM_MAX_INVALID_LINES)
+
+    def _collect_stream(self, stream) -> Tuple[str, Optional[str]]:
+        """读取同步流式响应，返回 (完整文本, finish_reason)；中途中止时关闭连接"""
+        if isinstance(stream, str):
+            return self._extract_response_content(stream), None # Raises for unexpected string responses
+        collector = self._new_stream_collector()
+        try:
+            for chunk in stream:
+                collector.feed(chunk)
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return collector.content(), collector.finish_reason
+
+    async def _collect_stream_async(self, stream) -> Tuple[str, Optional[str]]:
+        """_collect_stream 的异步版本"""
+        if isinstance(stream, str):
+            return self._extract_response_content(stream), None
+        collector = self._new_stream_collector()
+        try:
+            async for chunk in stream:
+                collector.feed(chunk)
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+        return collector.content(), collector.finish_reason
+
+    def _response_cache_path(self, prompt: Dict[str, Any]) -> Optional[str]:
+        """返回该 prompt 对应的响应缓存文件路径；缓存未启用或 temperature 过高（输出不确定）时返回 None"""
+        if not self.response_cache_enabled:
+            return None
+        llm_params = self.config.get("llm", {})
+        if float(llm_params.get("temperature", 0.1)) >= 0.2:
+            return None
+        # 以完整请求参数（model、messages、max_tokens、top_p、response_format 等）为键，任一参数变化都不会命中旧结果；
+        # timeout 与 stream 不影响输出内容，不计入
+        request_params = self._build_request_params(prompt, timeout=0)
+        request_params.pop("timeout", None)
+        request_params["base_url"] = llm_params.get("base_url")
+        key_source = json.dumps(request_params, ensure_ascii=False, sort_keys=True, default=str)
+        cache_key = hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+        return os.path.join(self.response_cache_dir, f"{cache_key}.txt")
+
+    def _all_responses_cached(self, prompts: List[Dict[str, Any]]) -> bool:
+        """所有 prompt 均已有缓存响应时返回 True"""
+        for prompt in prompts:
+            cache_path = self._response_cache_path(prompt)
+            if not cache_path or not os.path.exists(cache_path):
+                return False
+        return True
+
+    def _read_cached_response(self, cache_path: Optional[str]) -> Optional[str]:
+        """读取缓存的 LLM 响应，未命中时返回 None"""
+        if not cache_path:
+            return None
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = f.read()
+            print("信息: 命中 LLM 响应缓存，跳过 API 调用。")
+            return cached
+        except OSError:
+            return None
+
+    def _write_cached_response(self, cache_path: Optional[str], content: str, finish_reason: Optional[str]) -> None:
+        """
+        写入 LLM 响应缓存（先写临时文件再替换，避免留下不完整的缓存）。
+        仅缓存正常结束 (finish_reason == "stop") 且至少能解析出一个映射的响应，截断或无效输出不会被固化。
+        """
+        if not cache_path or not content or finish_reason != "stop" or not self._response_has_mappings(content):
+            return
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"警告: 写入 LLM 响应缓存失败: {e}")
+
     def _call_llm(self, prompt: Dict[str, Any], timeout: int = 120, mock_response_for_testing: Optional[str] = None) -> str:
         """调用 LLM API"""
         if mock_response_for_testing is not None:
@@ -251,37 +637,144 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
             print("LLM 客户端未初始化，将使用内置模拟响应。")
             return self._mock_llm_response(prompt)
 
+        cache_path = self._response_cache_path(prompt)
+        cached_response = self._read_cached_response(cache_path)
+        if cached_response is not None:
+            return cached_response
+
+        from openai import APITimeoutError
         try:
-            llm_params = self.config.get("llm", {})
-            model = llm_params.get("model", "deepseek-chat")
-            max_tokens = llm_params.get("max_tokens", 4096) # Increased default
-            top_p = llm_params.get("top_p", 0.7) # Example value, can be configured
-            temperature = llm_params.get("temperature", 0.1) # Example value for more deterministic output
-
-            response = self.llm_client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": prompt["system"]},
-                    {"role": "user", "content": prompt["user"]}
-                ],
-                max_tokens=max_tokens,
-                top_p=top_p,
-                temperature=temperature,
-                timeout=Timeout(float(timeout))
-            )
-            if isinstance(response, str):
-                # Log the first 500 characters of the unexpected string response
-                unexpected_response_preview = response[:500]
-                error_message = f"LLM API returned an unexpected string response. Preview: {unexpected_response_preview}"
-                print(f"错误: {error_message}") # Log for immediate visibility
-                raise RuntimeError(error_message) # Raise a more specific error
-            return response.choices[0].message.content
+            response = self.llm_client.chat.completions.create(**self._build_request_params(prompt, timeout, stream=self.stream))
+            if self.stream:
+                content, finish_reason = self._collect_stream(response)
+            else:
+                content, finish_reason = self._extract_response_content(response), self._extract_finish_reason(response)
+            self._write_cached_response(cache_path, content, finish_reason)
+            return content
         except APITimeoutError:
             print(f"错误: 调用 LLM API 超时 (超过 {timeout} 秒)")
             raise RuntimeError(f"调用 LLM API 超时 (超过 {timeout} 秒)")
         except Exception as e:
             print(f"错误: 调用 LLM API 时出错: {e}")
             raise RuntimeError(f"调用 LLM API 时出错: {e}")
+
+    async def _call_llm_async(self, async_client, prompt: Dict[str, Any], semaphore: asyncio.Semaphore, timeout: int = 120) -> str:
+        """异步调用 LLM API，并发数由 semaphore 限制"""
+        cache_path = self._response_cache_path(prompt)
+        cached_response = self._read_cached_response(cache_path)
+        if cached_response is not None:
+            return cached_response
+
+        from openai import APITimeoutError
+        async with semaphore:
+            try:
+                response = await async_client.chat.completions.create(**self._build_request_params(prompt, timeout, stream=self.stream))
+                if self.stream:
+                    content, finish_reason = await self._collect_stream_async(response)
+                else:
+                    content, finish_reason = self._extract_response_content(response), self._extract_finish_reason(response)
+                self._write_cached_response(cache_path, content, finish_reason)
+                return content
+            except APITimeoutError:
+                print(f"错误: 调用 LLM API 超时 (超过 {timeout} 秒)")
+                raise RuntimeError(f"调用 LLM API 超时 (超过 {timeout} 秒)")
+            except Exception as e:
+                print(f"错误: 调用 LLM API 时出错: {e}")
+                raise RuntimeError(f"调用 LLM API 时出错: {e}")
+
+    def _call_llm_with_retries(self, prompt: Dict[str, Any], max_retries: int, mock_response_for_testing: Optional[str] = None) -> str:
+        """同步调用 LLM，失败时按 max_retries 重试；全部失败时抛出 RuntimeError"""
+        for attempt in range(max_retries + 1):
+            try:
+                return self._call_llm(prompt, mock_response_for_testing=mock_response_for_testing)
+            except RuntimeError as e:
+                print(f"LLM 调用失败 (尝试 {attempt + 1}/{max_retries + 1}): {e}")
+                if attempt == max_retries:
+                    raise
+        return ""
+
+    def _build_warmup_params(self, system_prompt: str) -> Dict[str, Any]:
+        """前缀缓存预热请求的参数：只携带 system prompt，且只生成 1 个 token"""
+        params = self._build_request_params({"system": system_prompt, "user": "[]"}, timeout=30)
+        params["max_tokens"] = 1
+        return params
+
+    async def _warm_prefix_cache(self, async_client, system_prompt: str) -> None:
+        """只携带 system prompt 发送一次极小的请求，使后续批次命中已预热的前缀缓存。失败时忽略。"""
+        try:
+            await async_client.chat.completions.create(**self._build_warmup_params(system_prompt))
+        except Exception as e:
+            print(f"警告: 前缀缓存预热请求失败，将直接发送批次: {e}")
+
+    def _warm_prefix_cache_sync(self, system_prompt: str) -> None:
+        """_warm_prefix_cache 的同步版本，供线程池路径使用"""
+        try:
+            self.llm_client.chat.completions.create(**self._build_warmup_params(system_prompt))
+        except Exception as e:
+            print(f"警告: 前缀缓存预热请求失败，将直接发送批次: {e}")
+
+    def _call_llm_batches_threaded(self, prompts: List[Dict[str, Any]], max_retries: int, mock_response_for_testing: Optional[str] = None) -> List[Union[str, BaseException]]:
+        """
+        用线程池并发发送各批次（同步 OpenAI 客户端可在线程间共享，等待 HTTPS 响应时会释放 GIL）。
+        返回与 prompts 顺序一致的响应，失败的批次为异常对象。
+        """
+        if (self.prefix_cache_warmup and self.llm_client is not None and mock_response_for_testing is None
+                and len(prompts) > 1 and not self._all_responses_cached(prompts)):
+            self._warm_prefix_cache_sync(prompts[0]["system"])
+
+        def _call_with_retries(prompt: Dict[str, Any]) -> Union[str, BaseException]:
+            try:
+                return self._call_llm_with_retries(prompt, max_retries, mock_response_for_testing)
+            except Exception as e_call:
+                return e_call
+
+        if len(prompts) <= 1:
+            return [_call_with_retries(p) for p in prompts]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(prompts))) as executor:
+            return list(executor.map(_call_with_retries, prompts))
+
+    @staticmethod
+    def _in_running_event_loop() -> bool:
+        """当前线程已有运行中的事件循环时（asyncio.run 不可用）返回 True"""
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+    def _uses_async_client(self) -> bool:
+        """有调用方传入的异步客户端，或可在每次运行时新建异步客户端时返回 True"""
+        return self.async_llm_client is not None or self._create_async_client_per_run
+
+    async def _gather_llm_responses(self, prompts: List[Dict[str, Any]], max_retries: int) -> List[Union[str, BaseException]]:
+        """并发发送所有批次的请求，返回与 prompts 顺序一致的响应（失败的批次为异常对象）"""
+        if self.async_llm_client is not None:
+            return await self._gather_with_client(self.async_llm_client, prompts, max_retries)
+        # 每次运行新建异步客户端，并在当前事件循环结束前关闭其连接池
+        async_client = create_async_llm_client()
+        if async_client is None:
+            return [RuntimeError("异步 LLM 客户端未初始化。") for _ in prompts]
+        async with async_client:
+            return await self._gather_with_client(async_client, prompts, max_retries)
+
+    async def _gather_with_client(self, async_client, prompts: List[Dict[str, Any]], max_retries: int) -> List[Union[str, BaseException]]:
+        """用给定的异步客户端并发发送所有批次的请求"""
+        if self.prefix_cache_warmup and len(prompts) > 1 and not self._all_responses_cached(prompts):
+            await self._warm_prefix_cache(async_client, prompts[0]["system"])
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _call_with_retries(prompt: Dict[str, Any]) -> str:
+            for attempt in range(max_retries + 1):
+                try:
+                    return await self._call_llm_async(async_client, prompt, semaphore)
+                except RuntimeError as e:
+                    print(f"LLM 调用失败 (尝试 {attempt + 1}/{max_retries + 1}): {e}")
+                    if attempt == max_retries:
+                        raise
+            return ""
+
+        return await asyncio.gather(*[_call_with_retries(p) for p in prompts], return_exceptions=True)
     
     def _mock_llm_response(self, prompt: Dict[str, Any]) -> str:
         """生成模拟的 LLM 响应（用于测试）"""
@@ -299,85 +792,93 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
         except Exception:
             return "0,标题一\n1,正文" 
     
-    def _parse_llm_response(self, response: str) -> List[Dict[str, Any]]:
-        """解析 LLM 返回的简单 CSV 格式 (idx,style) 响应"""
-        logger_instance = logging.getLogger('llm_parser_errors_win32com')
+    def _parse_json_mappings(self, processed_response: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        解析结构化输出模式下的 {"mappings": [{"idx": ..., "style": ...}]} 响应。
+        不是合法 JSON 时返回 None，由调用方回退到 CSV 解析；无效条目会被跳过并记录警告。
+        """
+        try:
+            data = orjson.loads(processed_response) if _HAS_ORJSON else json.loads(processed_response)
+        except ValueError:
+            return None
+        entries = data.get("mappings") if isinstance(data, dict) else data
+        if not isinstance(entries, list):
+            return None
+
+        parsed_mappings = []
+        invalid_count = 0
+        for entry in entries:
+            style_name = entry.get("style") if isinstance(entry, dict) else None
+            idx = entry.get("idx") if isinstance(entry, dict) else None
+            if isinstance(idx, str) and idx.strip().isdigit():
+                idx = int(idx)
+            if not isinstance(idx, int) or isinstance(idx, bool) or not isinstance(style_name, str) or not style_name.strip():
+                invalid_count += 1
+                continue
+            style_name = style_name.strip()
+            parsed_mappings.append({"idx": idx, "style": _CHINESE_TITLE_MAP.get(style_name, style_name)})
+        if invalid_count:
+            warning_msg = f"{invalid_count} 个 JSON 映射条目无效（期望 {{'idx': int, 'style': str}}）"
+            print(f"警告: {warning_msg}")
+            logger.warning(f"{warning_msg}\n--- Raw LLM Response ---\n{processed_response}\n--- End Raw Response ---")
+        return parsed_mappings
+
+    @staticmethod
+    def _strip_code_fences(response: str) -> str:
+        """去掉 LLM 响应外层的 Markdown 代码块标记"""
         processed_response = re.sub(r'^\s*```[a-zA-Z]*\n', '', response.strip(), flags=re.MULTILINE)
         processed_response = re.sub(r'\n```\s*$', '', processed_response.strip(), flags=re.MULTILINE)
-        processed_response = processed_response.strip()
+        return processed_response.strip()
 
-        parsed_mappings = []
-        lines = processed_response.splitlines()
+    def _response_has_mappings(self, response: str) -> bool:
+        """与 _parse_llm_response 的判定一致：响应至少能解析出一个映射时返回 True（不打印解析日志）"""
+        processed_response = self._strip_code_fences(response)
+        if processed_response.startswith(('{', '[')):
+            json_mappings = self._parse_json_mappings(processed_response)
+            if json_mappings is not None:
+                return bool(json_mappings)
+        return _LLM_LINE_RE.search(processed_response) is not None
 
-        for i, line in enumerate(lines):
-            original_line_for_debug = line # Keep original for debug
-            line = line.strip()
-            if not line: continue
-            
-            print(f"DEBUG _parse_llm_response: Processing line {i+1}/{len(lines)}: '{original_line_for_debug}' (stripped: '{line}')")
-            
-            parts = line.split(',', 1)
-            print(f"DEBUG _parse_llm_response: Parts after split: {parts}")
+    def _parse_llm_response(self, response: str) -> List[Dict[str, Any]]:
+        """解析 LLM 响应：结构化输出的 JSON 对象，或简单 CSV 格式 (idx,style)"""
+        logger_instance = logging.getLogger('llm_parser_errors_win32com')
+        processed_response = self._strip_code_fences(response)
 
-            if len(parts) != 2:
-                warning_msg = f"解析行 {i+1} 失败 - 格式无效: '{line}'"
-                print(f"警告: {warning_msg}")
-                logger_instance.warning(f"{warning_msg}\n--- Raw LLM Response ---\n{response}\n--- End Raw Response ---")
-                continue
-                
-            idx_str, style_name_raw = parts[0].strip(), parts[1]
-            print(f"DEBUG _parse_llm_response: idx_str='{idx_str}', style_name_raw='{style_name_raw}'")
-            
-            # Thoroughly clean style_name, removing leading/trailing whitespace and carriage returns
-            style_name = style_name_raw.replace('\r', '').strip()
-            print(f"DEBUG _parse_llm_response: Cleaned style_name='{style_name}'")
+        if processed_response.startswith(('{', '[')):
+            json_mappings = self._parse_json_mappings(processed_response)
+            if json_mappings is not None:
+                print(f"成功解析了 {len(json_mappings)} 个映射 (JSON)。")
+                return json_mappings
 
+        # One regex walk yields (idx, style) pairs directly; malformed lines simply do not match
+        parsed_mappings = []
+        for match in _LLM_LINE_RE.finditer(processed_response):
+            style_name = match.group(2)
             # Normalize Chinese numeral titles to Arabic numerals for direct matching
-            normalized_style_name = style_name
-            if style_name == "标题一":
-                normalized_style_name = "标题1"
-            elif style_name == "标题二":
-                normalized_style_name = "标题2"
-            
-            if normalized_style_name != style_name:
-                print(f"DEBUG _parse_llm_response: Normalized style_name from '{style_name}' to '{normalized_style_name}'")
-                style_name = normalized_style_name
-            
-            try:
-                idx = int(idx_str)
-            except ValueError:
-                warning_msg = f"解析行 {i+1} 失败 - 索引不是有效整数: '{idx_str}' in line '{line}'"
-                print(f"警告: {warning_msg}")
-                logger_instance.warning(f"{warning_msg}\n--- Raw LLM Response ---\n{response}\n--- End Raw Response ---")
-                continue
-            if not style_name:
-                 warning_msg = f"解析行 {i+1} 失败 - 样式名称为空: '{line}'"
-                 print(f"警告: {warning_msg}")
-                 logger_instance.warning(f"{warning_msg}\n--- Raw LLM Response ---\n{response}\n--- End Raw Response ---")
-                 continue
-            parsed_mappings.append({"idx": idx, "style": style_name})
+            style_name = _CHINESE_TITLE_MAP.get(style_name, style_name)
+            parsed_mappings.append({"idx": int(match.group(1)), "style": style_name})
+
+        non_blank_line_count = len(_NON_BLANK_LINE_RE.findall(processed_response))
+        if len(parsed_mappings) < non_blank_line_count:
+            warning_msg = f"{non_blank_line_count - len(parsed_mappings)} 行解析失败 - 格式无效（期望 '索引,样式名'）"
+            print(f"警告: {warning_msg}")
+            logger_instance.warning(f"{warning_msg}\n--- Raw LLM Response ---\n{response}\n--- End Raw Response ---")
         print(f"成功解析了 {len(parsed_mappings)} 个映射。")
         return parsed_mappings
     
-    def _map_styles_to_template(self, llm_mappings: List[Dict[str, Any]], template_name: str) -> List[Dict[str, Any]]:
-        """将 LLM 返回的样式名映射到指定模板的样式名"""
-        template_content = None
+    def _parse_template_styles(self, template_content: Dict[str, Any], template_name: str) -> Tuple[str, List[str], List[str], frozenset, str, Tuple[List[str], Dict[str, str]]]:
+        """
+        解析模板中的样式信息，返回 (prefix, 基础样式名列表, 带前缀样式名列表, 带前缀样式名集合, 默认回退样式, 模糊匹配索引)。
+        结果按 template_content 对象缓存在 self._parsed_template_cache 中，模板数据不变时分批调用无需重复解析。
+        """
+        cached = getattr(self, '_parsed_template_cache', None)
+        if cached is not None and cached[0] is template_content:
+            return cached[1]
+
         base_template_style_names = [] # Unprefixed names from template_content['样式']['样式']
         valid_prefixed_style_names_in_template = [] # Prefixed names that are valid in the template
         template_prefix = ''
-
-        if self.template_data:
-            template_content = self.template_data
-        else:
-            print(f"警告: _map_styles_to_template 未收到 template_data。尝试从 manager 加载 '{template_name}'。")
-            try:
-                template_content = self.template_manager.load_template_json(template_name=template_name)
-            except Exception as e:
-                print(f"警告: 通过 template_manager 加载模板 '{template_name}' 时出错: {e}")
-
-        if not template_content:
-            print(f"错误: 无法获取模板 '{template_name}' 的内容，无法进行样式映射。")
-            return []
+        actual_styles_dict = None
 
         # Extract prefix and base style names from the correct nested structure
         styles_level1 = template_content.get('样式', {})
@@ -409,17 +910,55 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
             print(f"警告: 未能从模板 '{template_name}' 构建有效的带前缀样式列表。LLM映射可能不准确。")
             # If absolutely no valid styles, we can't map.
             # However, the prompt to LLM would have also been empty, so LLM might return generic styles.
-        
-        print(f"DEBUG _map_styles_to_template: template_prefix = '{template_prefix}'")
-        print(f"DEBUG _map_styles_to_template: base_template_style_names = {base_template_style_names}")
-        print(f"DEBUG _map_styles_to_template: valid_prefixed_style_names_in_template = {valid_prefixed_style_names_in_template}")
 
-        mapped_styles_output = []
+        valid_prefixed_style_set = frozenset(valid_prefixed_style_names_in_template)
         default_fallback_prefixed_style = f"{template_prefix}正文"
-        if default_fallback_prefixed_style not in valid_prefixed_style_names_in_template:
+        if default_fallback_prefixed_style not in valid_prefixed_style_set:
             # If "自定义正文" is not valid, use the first valid style as fallback, or an empty string if none.
             default_fallback_prefixed_style = valid_prefixed_style_names_in_template[0] if valid_prefixed_style_names_in_template else ""
-        print(f"DEBUG _map_styles_to_template: default_fallback_prefixed_style = '{default_fallback_prefixed_style}'")
+
+        parsed = (
+            template_prefix,
+            base_template_style_names,
+            valid_prefixed_style_names_in_template,
+            valid_prefixed_style_set,
+            default_fallback_prefixed_style,
+            self._build_fuzzy_index(base_template_style_names),
+        )
+        self._parsed_template_cache = (template_content, parsed)
+        return parsed
+
+    def _map_styles_to_template(self, llm_mappings: List[Dict[str, Any]], template_name: str) -> List[Dict[str, Any]]:
+        """将 LLM 返回的样式名映射到指定模板的样式名"""
+        template_content = None
+
+        if self.template_data:
+            template_content = self.template_data
+        else:
+            print(f"警告: _map_styles_to_template 未收到 template_data。尝试从 manager 加载 '{template_name}'。")
+            try:
+                template_content = self.template_manager.load_template_json(template_name=template_name)
+            except Exception as e:
+                print(f"警告: 通过 template_manager 加载模板 '{template_name}' 时出错: {e}")
+
+        if not template_content:
+            print(f"错误: 无法获取模板 '{template_name}' 的内容，无法进行样式映射。")
+            return []
+
+        (template_prefix,
+         base_template_style_names,
+         valid_prefixed_style_names_in_template,
+         valid_prefixed_style_set,
+         default_fallback_prefixed_style,
+         fuzzy_index) = self._parse_template_styles(template_content, template_name)
+        
+        logger.debug("_map_styles_to_template: template_prefix = '%s'", template_prefix)
+        logger.debug("_map_styles_to_template: base_template_style_names = %s", base_template_style_names)
+        logger.debug("_map_styles_to_template: valid_prefixed_style_names_in_template = %s", valid_prefixed_style_names_in_template)
+
+        mapped_styles_output = []
+        fuzzy_match_cache: Dict[str, str] = {} # LLM 输出中样式名大量重复，每个不同的名字只做一次模糊匹配
+        logger.debug("_map_styles_to_template: default_fallback_prefixed_style = '%s'", default_fallback_prefixed_style)
 
         for item in llm_mappings:
             llm_idx = item["idx"]
@@ -429,26 +968,29 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
 
             # 1. Attempt direct match with prefix
             llm_style_name_unprefixed = item["style"] # Ensure this is defined before use in print
-            print(f"\nDEBUG _map_styles_to_template: Processing item for idx={llm_idx}, llm_style_unprefixed='{llm_style_name_unprefixed}'")
+            logger.debug("_map_styles_to_template: Processing item for idx=%s, llm_style_unprefixed='%s'", llm_idx, llm_style_name_unprefixed)
             potential_direct_match_prefixed = f"{template_prefix}{llm_style_name_unprefixed}"
-            print(f"DEBUG _map_styles_to_template: Attempting direct match with '{potential_direct_match_prefixed}'")
+            logger.debug("_map_styles_to_template: Attempting direct match with '%s'", potential_direct_match_prefixed)
             
-            is_direct_match = potential_direct_match_prefixed in valid_prefixed_style_names_in_template
-            print(f"DEBUG _map_styles_to_template: Direct match result for '{potential_direct_match_prefixed}': {is_direct_match}")
+            is_direct_match = potential_direct_match_prefixed in valid_prefixed_style_set
+            logger.debug("_map_styles_to_template: Direct match result for '%s': %s", potential_direct_match_prefixed, is_direct_match)
 
             if is_direct_match:
                 final_style_to_apply = potential_direct_match_prefixed
             else:
-                print(f"DEBUG _map_styles_to_template: Direct match failed. Trying fuzzy match for '{llm_style_name_unprefixed}'.")
+                logger.debug("_map_styles_to_template: Direct match failed. Trying fuzzy match for '%s'.", llm_style_name_unprefixed)
                 # 2. If direct match fails, try fuzzy matching against base (unprefixed) template style names
                 if base_template_style_names:
-                    best_match_unprefixed = self._find_best_match_unprefixed(llm_style_name_unprefixed, base_template_style_names)
-                    print(f"DEBUG _map_styles_to_template: Fuzzy best_match_unprefixed='{best_match_unprefixed}'")
+                    best_match_unprefixed = fuzzy_match_cache.get(llm_style_name_unprefixed)
+                    if best_match_unprefixed is None:
+                        best_match_unprefixed = self._find_best_match_unprefixed(llm_style_name_unprefixed, base_template_style_names, fuzzy_index)
+                        fuzzy_match_cache[llm_style_name_unprefixed] = best_match_unprefixed
+                    logger.debug("_map_styles_to_template: Fuzzy best_match_unprefixed='%s'", best_match_unprefixed)
                     potential_fuzzy_match_prefixed = f"{template_prefix}{best_match_unprefixed}"
-                    print(f"DEBUG _map_styles_to_template: Attempting fuzzy match with '{potential_fuzzy_match_prefixed}'")
+                    logger.debug("_map_styles_to_template: Attempting fuzzy match with '%s'", potential_fuzzy_match_prefixed)
                     
-                    is_fuzzy_match_valid = potential_fuzzy_match_prefixed in valid_prefixed_style_names_in_template
-                    print(f"DEBUG _map_styles_to_template: Fuzzy match result for '{potential_fuzzy_match_prefixed}': {is_fuzzy_match_valid}")
+                    is_fuzzy_match_valid = potential_fuzzy_match_prefixed in valid_prefixed_style_set
+                    logger.debug("_map_styles_to_template: Fuzzy match result for '%s': %s", potential_fuzzy_match_prefixed, is_fuzzy_match_valid)
 
                     if is_fuzzy_match_valid:
                         final_style_to_apply = potential_fuzzy_match_prefixed
@@ -459,7 +1001,7 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
                      print(f"警告: LLM样式 '{llm_style_name_unprefixed}' (段落 {llm_idx}) 直接匹配失败，且无基础样式进行模糊匹配。回退到默认。")
                      final_style_to_apply = default_fallback_prefixed_style
             
-            print(f"DEBUG _map_styles_to_template: Style to apply before final fallback check: '{final_style_to_apply}' for idx={llm_idx}")
+            logger.debug("_map_styles_to_template: Style to apply before final fallback check: '%s' for idx=%s", final_style_to_apply, llm_idx)
             if not final_style_to_apply and valid_prefixed_style_names_in_template:
                 print(f"警告: LLM样式 '{llm_style_name_unprefixed}' (段落 {llm_idx}) 最终未能映射到有效样式，且默认回退也为空。将使用模板中第一个有效样式: '{valid_prefixed_style_names_in_template[0]}'")
                 final_style_to_apply = valid_prefixed_style_names_in_template[0]
@@ -467,29 +1009,34 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
                  print(f"错误: LLM样式 '{llm_style_name_unprefixed}' (段落 {llm_idx}) 无法映射，且模板中无有效样式可回退。跳过此映射。")
                  continue # Skip this mapping
 
-            print(f"DEBUG _map_styles_to_template: Final style for idx={llm_idx} is '{final_style_to_apply}'")
+            logger.debug("_map_styles_to_template: Final style for idx=%s is '%s'", llm_idx, final_style_to_apply)
             mapped_styles_output.append({"paragraph_index": llm_idx, "style": final_style_to_apply})
         return mapped_styles_output
     
-    def _find_best_match_unprefixed(self, llm_style_name: str, unprefixed_template_styles: List[str]) -> str:
-        """使用模糊匹配找到最匹配的无前缀样式名"""
+    @staticmethod
+    def _build_fuzzy_index(unprefixed_template_styles: List[str]) -> Tuple[List[str], Dict[str, str]]:
+        """为模糊匹配预先构建 (小写样式名列表, 小写名 -> 原样式名) 索引，每次映射只需构建一次"""
+        lowered_choices = [s.lower() for s in unprefixed_template_styles]
+        lower_to_original = dict(zip(lowered_choices, unprefixed_template_styles))
+        return lowered_choices, lower_to_original
+
+    def _find_best_match_unprefixed(self, llm_style_name: str, unprefixed_template_styles: List[str],
+                                    fuzzy_index: Optional[Tuple[List[str], Dict[str, str]]] = None) -> str:
+        """使用模糊匹配找到最匹配的无前缀样式名（fuzzy_index 可由调用方通过 _build_fuzzy_index 预先构建）"""
         if not unprefixed_template_styles: return "正文" # Default if no styles to match against
 
-        try:
-            from fuzzywuzzy import fuzz 
-            best_match = "正文" # Default
-            highest_similarity = 0
-            for style_option in unprefixed_template_styles:
-                similarity = fuzz.ratio(style_option.lower(), llm_style_name.lower())
-                if similarity > highest_similarity:
-                    highest_similarity = similarity
-                    best_match = style_option
-            if highest_similarity > 75: # Adjusted threshold
-                return best_match
-        except ImportError:
-            # Fallback if fuzzywuzzy is not available
-            if llm_style_name in unprefixed_template_styles:
-                return llm_style_name
+        lowered_choices, lower_to_original = fuzzy_index or self._build_fuzzy_index(unprefixed_template_styles)
+        rapidfuzz_modules = _get_rapidfuzz()
+        if rapidfuzz_modules:
+            fuzz, fuzz_process = rapidfuzz_modules
+            match = fuzz_process.extractOne(llm_style_name.lower(), lowered_choices, scorer=fuzz.ratio, score_cutoff=75)
+            if match and match[1] > 75: # Adjusted threshold
+                return lower_to_original[match[0]]
+        else:
+            # Fallback if rapidfuzz is not available: difflib 的相似度与 fuzz.ratio/100 同量级
+            matches = difflib.get_close_matches(llm_style_name.lower(), lowered_choices, n=1, cutoff=0.75)
+            if matches:
+                return lower_to_original[matches[0]]
         return "正文" # Ultimate fallback
     
     def generate_mapping(self,
@@ -517,28 +1064,28 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
         if mock_llm_response_str_for_testing:
             print("信息: 本次 generate_mapping 调用将使用外部提供的模拟LLM响应。")
 
+        # Determine the actual start and end for processing
+        actual_start_index = middle_start_index if middle_start_index is not None else 0
+        actual_end_index = back_start_index # This can be None
+
+        # Window the DataFrame with a boolean mask before extraction, so paragraphs
+        # outside [actual_start_index, actual_end_index) are never materialized as dicts.
+        filtered_df = doc_df
+        if 'paragraph_index' in doc_df.columns and 'text' in doc_df.columns:
+            mask = doc_df['paragraph_index'] >= actual_start_index
+            if actual_end_index is not None:
+                mask &= doc_df['paragraph_index'] < actual_end_index
+            filtered_df = doc_df.loc[mask, ['paragraph_index', 'text']]
+
         try:
-            all_paragraphs_data = self._extract_paragraphs_from_df(doc_df)
+            preprocessed_paragraphs = self._preprocess_paragraphs(filtered_df)
         except ValueError as e:
-            print(f"错误: 从DataFrame提取段落时出错: {e}")
+            print(f"错误: 从DataFrame提取和预处理段落时出错: {e}")
             return []
         except Exception as e_general:
             print(f"错误: 提取段落时发生未知错误: {e_general}")
             return []
 
-        paragraphs_to_process = []
-        # Determine the actual start and end for processing
-        actual_start_index = middle_start_index if middle_start_index is not None else 0
-        actual_end_index = back_start_index # This can be None
-
-        for para in all_paragraphs_data:
-            para_idx = para['idx']
-            # Condition: paragraph index must be >= actual_start_index
-            # AND (actual_end_index is None OR paragraph index < actual_end_index)
-            if para_idx >= actual_start_index and \
-               (actual_end_index is None or para_idx < actual_end_index):
-                paragraphs_to_process.append(para)
-
         if middle_start_index is not None:
             print(f"LLM 映射将从段落索引 {actual_start_index} 开始。")
         if back_start_index is not None:
@@ -546,19 +1093,29 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
         else:
             print(f"LLM 映射将处理到文档末尾（从索引 {actual_start_index} 开始）。")
         
-        print(f"筛选后，LLM 将处理 {len(paragraphs_to_process)} 个段落。")
+        print(f"筛选后，LLM 将处理 {len(preprocessed_paragraphs)} 个段落。")
 
-        if not paragraphs_to_process:
+        if not preprocessed_paragraphs:
             print("筛选后没有需要 LLM 处理的段落。")
             return []
 
-        preprocessed_paragraphs = self._preprocess_paragraphs(paragraphs_to_process)
+        # High-confidence rule matches (numbered headings) skip the LLM and are mapped directly;
+        # only the remaining paragraphs are sent. The confidence flag itself is never sent to the LLM.
+        skip_high_confidence = self.skip_high_confidence and mock_llm_response_str_for_testing is None
+        rule_based_mappings = []
+        llm_paragraphs = []
+        for para in preprocessed_paragraphs:
+            if para.pop("confidence", None) == "high" and skip_high_confidence:
+                suggestion = para["suggestion"]
+                rule_based_mappings.append({"idx": para["idx"], "style": _CHINESE_TITLE_MAP.get(suggestion, suggestion)})
+            else:
+                llm_paragraphs.append(para)
+        if rule_based_mappings:
+            print(f"{len(rule_based_mappings)} 个段落由规则高置信度识别，跳过 LLM；LLM 将处理其余 {len(llm_paragraphs)} 个段落。")
         
-        current_batch = preprocessed_paragraphs # Process all in one batch for now
         all_llm_raw_mappings = [] 
 
         template_styles_for_prompt = []
-        unprefixed_template_styles = [] # For _map_styles_to_template
         
         # Ensure template_data is loaded if not already available
         if not self.template_data:
@@ -574,53 +1131,49 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
                 return []
 
 
-        # Correctly extract base style names for the LLM prompt
+        # Base (unprefixed) style names for the LLM prompt, taken from the parsed-template cache
+        # instead of walking template_data['样式']['样式'] again
         if self.template_data:
-            styles_level1_for_prompt = self.template_data.get('样式', {})
-            if isinstance(styles_level1_for_prompt, dict):
-                actual_styles_dict_for_prompt = styles_level1_for_prompt.get('样式', {})
-                if isinstance(actual_styles_dict_for_prompt, dict):
-                    # These are the unprefixed names LLM should work with
-                    # Ensure these are also cleaned
-                    cleaned_style_names_for_prompt = []
-                    for style_key in actual_styles_dict_for_prompt.keys():
-                        cleaned_key = style_key.strip()
-                        if cleaned_key:
-                            cleaned_style_names_for_prompt.append(cleaned_key)
-                    
-                    template_styles_for_prompt = cleaned_style_names_for_prompt
-                    # unprefixed_template_styles is used by _map_styles_to_template's fuzzy matching,
-                    # and should be the same list of cleaned names.
-                    unprefixed_template_styles = cleaned_style_names_for_prompt
+            template_styles_for_prompt = self._parse_template_styles(self.template_data, template_name)[1]
             
         if not template_styles_for_prompt:
             print("警告: 未能从模板提取样式列表以供LLM提示。LLM可能无法准确映射。")
         
-        prompt = self._build_llm_prompt(current_batch, template_styles_for_prompt)
-        
-        llm_response_str = ""
-        for attempt in range(max_retries + 1):
-            try:
-                llm_response_str = self._call_llm(prompt, mock_response_for_testing=mock_llm_response_str_for_testing)
-                break
-            except RuntimeError as e:
-                print(f"LLM 调用失败 (尝试 {attempt + 1}/{max_retries + 1}): {e}")
-                if attempt == max_retries:
-                    print("达到最大重试次数，LLM 映射生成失败。")
-                    return [] 
-            except Exception as e_call:
-                print(f"LLM 调用时发生未知错误 (尝试 {attempt + 1}): {e_call}")
-                if attempt == max_retries: return []
+        # Split into batches so long documents become several small, concurrent requests.
+        # A test mock response covers the whole document, so it is kept as a single batch.
+        batch_size = max(1, len(llm_paragraphs)) if mock_llm_response_str_for_testing else self.batch_size
+        batches = [llm_paragraphs[i:i + batch_size] for i in range(0, len(llm_paragraphs), batch_size)]
+        # The system prompt (incl. the sorted template style list) is identical for every batch,
+        # so the provider's prefix cache can reuse it across the fan-out.
+        self._cached_system_prompt = self._build_system_prompt(template_styles_for_prompt)
+        prompts = [self._build_llm_prompt(batch, system_prompt=self._cached_system_prompt) for batch in batches]
+        print(f"LLM 映射将分为 {len(prompts)} 个批次发送（每批最多 {batch_size} 个段落）。")
 
-        if not llm_response_str:
-            print("LLM 未返回有效响应。")
-            return []
+        if self._uses_async_client() and mock_llm_response_str_for_testing is None and not self._in_running_event_loop():
+            llm_responses = asyncio.run(self._gather_llm_responses(prompts, max_retries))
+        else:
+            # Synchronous callers (no async client, or already inside an event loop) fan out on threads instead
+            llm_responses = self._call_llm_batches_threaded(prompts, max_retries, mock_llm_response_str_for_testing)
 
-        parsed_batch_mappings = self._parse_llm_response(llm_response_str)
-        all_llm_raw_mappings.extend(parsed_batch_mappings)
+        for batch_no, llm_response_str in enumerate(llm_responses, start=1):
+            if isinstance(llm_response_str, BaseException):
+                print(f"达到最大重试次数，批次 {batch_no}/{len(llm_responses)} 的 LLM 映射生成失败: {llm_response_str}")
+                continue
+            if not llm_response_str:
+                print(f"批次 {batch_no}/{len(llm_responses)}: LLM 未返回有效响应。")
+                continue
+            all_llm_raw_mappings.extend(self._parse_llm_response(llm_response_str))
+        if rule_based_mappings:
+            # 按 idx 合并规则结果与 LLM 结果（规则结果优先），并恢复段落顺序
+            merged_by_idx = {mapping["idx"]: mapping for mapping in all_llm_raw_mappings}
+            merged_by_idx.update((mapping["idx"], mapping) for mapping in rule_based_mappings)
+            all_llm_raw_mappings = [merged_by_idx[idx] for idx in sorted(merged_by_idx)]
+
+        if not all_llm_raw_mappings:
+            print("LLM 未返回有效响应，LLM 映射生成失败。")
+            return []
 
-        # Pass unprefixed_template_styles to _map_styles_to_template if that's what it expects
-        # Or adjust _map_styles_to_template to handle prefixed styles from self.template_data
+        # _map_styles_to_template reuses the same parsed-template cache as the prompt above
         final_mapped_styles = self._map_styles_to_template(all_llm_raw_mappings, template_name) # template_name is used if self.template_data is None
         
         # Optional: Save mapping
@@ -635,11 +1188,15 @@ class LLMStyleMapper: # Renamed from LLMStyleMapperGenerator
         """
         try:
             output_dir = os.path.dirname(output_path)
-            if output_dir and not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(mappings, f, ensure_ascii=False, indent=2)
-            print(f"样式映射已保存到: {output_path}")
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            # 一次性写入，避免 json.dump 逐 token 写文件；优先使用 orjson
+            if _HAS_ORJSON:
+                payload = orjson.dumps(mappings, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            else:
+                payload = json.dumps(mappings, ensure_ascii=False, indent=2).encode('utf-8')
+            Path(output_path).write_bytes(payload)
+            logger.info("样式映射已保存到: %s", output_path)
         except Exception as e:
             print(f"错误: 保存样式映射到文件时出错: {e}")
 
@@ -648,8 +1205,8 @@ if __name__ == '__main__':
     print("LLMStyleMapper (win32com version) - 测试模块运行中...")
     
     from template_manager_win32 import TemplateManagerWin32 # Placed import here
-    from pathlib import Path # Placed import here
-    # import pandas as pd # Already imported at the top
+    import pandas as pd # Imported lazily; the module itself only needs it for type hints
+    import io
 
     # 1. 定义模拟LLM回复
     # 假设模板 "2_20250520202508202667" 的前缀是 "自定义"
@@ -681,19 +1238,15 @@ if __name__ == '__main__':
     # 11,表题         -> 期望: 自定义表题 (直接匹配)
 
     # 2. 创建模拟 DataFrame
-    mock_para_indices = []
+    # 直接用 read_csv 解析 "索引,样式名"，只取索引列；文本列按列拼接生成
     try:
-        mock_para_indices = [int(line.split(',')[0]) for line in mock_llm_output_str.strip().split('\n') if line.strip()]
+        mock_df = pd.read_csv(io.StringIO(mock_llm_output_str), header=None, names=['paragraph_index', 'style'],
+                              usecols=[0], dtype={'paragraph_index': 'int32'}, skip_blank_lines=True)
     except ValueError as e:
         print(f"解析模拟LLM输出中的索引时出错: {e}")
         print("请检查 mock_llm_output_str 格式是否为 '索引,样式名'")
         exit()
-    
-    mock_data = {
-        'paragraph_index': mock_para_indices,
-        'text': [f"这是段落 {i} 的模拟文本。" for i in mock_para_indices],
-    }
-    mock_df = pd.DataFrame(mock_data)
+    mock_df['text'] = "这是段落 " + mock_df['paragraph_index'].astype(str) + " 的模拟文本。"
 
     # 3. 设置模板名称和加载模板数据
     # 根据数据库输出，Name 字段存储的是 '2'，而不是完整的文件名（不含.json）
@@ -711,7 +1264,7 @@ if __name__ == '__main__':
     available_templates_from_db = tm.list_selectable_templates()
     if available_templates_from_db:
         for tpl_info in available_templates_from_db:
-            print(f"  ID: {tpl_info.get('id')}, Name: {tpl_info.get('name')}, Name_repr: {tpl_info.get('name_repr')}, Filename: {tpl_info.get('json_filename')}")
+            print(f"  ID: {tpl_info.get('id')}, Name: {tpl_info.get('name')}, Name_repr: {tpl_info.get('name')!r}, Filename: {tpl_info.get('json_filename')}")
     else:
         print("  数据库中没有找到模板记录。")
     print("--- 列表结束 ---\n")
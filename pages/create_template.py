@@ -35,7 +35,12 @@ PAGE_DIR = Path(__file__).parent # win32com/pages/
 WIN32COM_ROOT_DIR = PAGE_DIR.parent # win32com/
 USER_FILES_BASE_DIR = WIN32COM_ROOT_DIR / "user_files"
 
-template_manager = TemplateManagerWin32(base_user_dir=USER_FILES_BASE_DIR)
+@st.cache_resource
+def get_template_manager(base_user_dir: Path) -> TemplateManagerWin32:
+    """Creates the manager (directory check + SQLite connection) once instead of on every rerun."""
+    return TemplateManagerWin32(base_user_dir=base_user_dir)
+
+template_manager = get_template_manager(USER_FILES_BASE_DIR)
 
 # --- Define Styles to Configure ---
 # These keys should match the keys expected by form_data_to_json_win32
@@ -49,6 +54,11 @@ STYLES_TO_CONFIGURE = {
     "表题": "表格标题样式 (表题)",
     # Add other common styles like "参考文献", "摘要" etc.
 }
+# (internal name, display name, default config) for each style section, resolved once up front
+_STYLE_SPECS = tuple(
+    (internal_name, display_name, WIN32COM_DEFAULT_STYLES_STRUCTURE.get(internal_name, {}))
+    for internal_name, display_name in STYLES_TO_CONFIGURE.items()
+)
 
 # --- Form Rendering ---
 
@@ -64,8 +74,7 @@ st.caption("为文档中的主要元素（如正文、各级标题、图/表题
 
 styles_form_data = {}
 # Use default structures from ui_components for each style section
-for internal_name, display_name in STYLES_TO_CONFIGURE.items():
-    default_config_for_style = WIN32COM_DEFAULT_STYLES_STRUCTURE.get(internal_name, {})
+for internal_name, display_name, default_config_for_style in _STYLE_SPECS:
     styles_form_data[internal_name] = render_style_section(
         style_internal_name=internal_name, 
         display_name=display_name,
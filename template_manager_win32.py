@@ -2,11 +2,84 @@
 import sqlite3
 import json
 import os
+import contextlib
+import logging
+import mmap
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import datetime
+import functools
 import re
 from typing import Optional, Tuple, List, Dict, Any
 
+# Errors go through logging (handlers are configured by the entry point); with no configuration,
+# WARNING and above still reach stderr via logging's last-resort handler
+logger = logging.getLogger(__name__)
+
+# orjson serializes/parses noticeably faster than the stdlib json; fall back when it is not installed
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    _HAS_ORJSON = False
+
+# Template files at least this large are parsed from a memory map instead of an intermediate bytes copy
+_MMAP_READ_THRESHOLD = 64 * 1024
+
+def _dumps_template_json(content: Any) -> bytes:
+    """Serializes template content to indented UTF-8 JSON bytes (orjson when available)."""
+    if _HAS_ORJSON:
+        return orjson.dumps(content, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, indent=2).encode('utf-8')
+
+def _loads_template_json(data: bytes) -> Any:
+    """Parses UTF-8 JSON bytes (orjson when available)."""
+    if _HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8'))
+
+@functools.lru_cache(maxsize=32)
+def _load_template_file(abs_path: str, mtime_ns: int) -> Dict[str, Any]:
+    """
+    Reads and parses a template JSON file. Cached per (absolute path, mtime), so an
+    unchanged template is parsed once and an edited file is picked up on the next load.
+    Kept at module level so the cache does not hold TemplateManagerWin32 instances alive.
+    """
+    with open(abs_path, 'rb') as f:
+        if _HAS_ORJSON and os.fstat(f.fileno()).st_size >= _MMAP_READ_THRESHOLD:
+            # Large file: let orjson parse straight from the mapped pages, skipping the read() copy
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return orjson.loads(view)
+        return _loads_template_json(f.read())
+
+# Filename sanitizing: drop everything but word chars, whitespace and '-', then collapse dash/space runs
+_RE_ILLEGAL_FILENAME_CHARS = re.compile(r'[^\w\s-]')
+_RE_DASH_RUNS = re.compile(r'[-\s]+')
+# Deletion table for the ASCII chars the pattern above removes (derived from it, so both paths agree)
+_ASCII_ILLEGAL_FILENAME_TABLE = str.maketrans(
+    '', '', ''.join(c for c in map(chr, range(128)) if _RE_ILLEGAL_FILENAME_CHARS.match(c))
+)
+
+def _write_bytes_atomic(path: Path, payload: bytes) -> None:
+    """
+    Writes payload to a temporary file with raw os.write calls, then renames it over path,
+    so readers never see a partially written file.
+    """
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        view = memoryview(payload)
+        while view: # A single write normally suffices; loop in case of a short write
+            view = view[os.write(fd, view):]
+    except BaseException:
+        os.close(fd)
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+    os.close(fd)
+    os.replace(tmp_path, path)
+
 class TemplateManagerWin32:
     """
     Manages style templates for the win32com version of the application.
@@ -23,24 +96,34 @@ class TemplateManagerWin32:
         self.base_user_dir = base_user_dir
         self.templates_dir = self.base_user_dir / "templates"
         self.db_path = self.base_user_dir / "templates_map.db"
+        # One connection for the manager's lifetime; Streamlit may call in from several threads,
+        # so all access to it is serialized by this lock.
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
         
         self._init_db()
 
     def _sanitize_filename(self, name: str) -> str:
         """Sanitizes a string to be used as a filename."""
-        name = re.sub(r'[^\w\s-]', '', name).strip()
-        name = re.sub(r'[-\s]+', '-', name)
+        if name.isascii():
+            name = name.translate(_ASCII_ILLEGAL_FILENAME_TABLE).strip()
+        else:
+            name = _RE_ILLEGAL_FILENAME_CHARS.sub('', name).strip()
+        name = _RE_DASH_RUNS.sub('-', name)
         return name if name else "unnamed_template"
 
     def _init_db(self):
-        """Initializes the database and templates directory if they don't exist."""
+        """Initializes the database and templates directory if they don't exist, and opens the shared connection."""
         try:
             self.templates_dir.mkdir(parents=True, exist_ok=True)
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # Autocommit mode (isolation_level=None); writes use explicit transactions via _transaction()
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA temp_store=MEMORY")
             
-            cursor.execute("""
+            self._conn.execute("""
                 CREATE TABLE IF NOT EXISTS templates (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     name TEXT NOT NULL UNIQUE,
@@ -48,13 +131,40 @@ class TemplateManagerWin32:
                     created_at TEXT DEFAULT CURRENT_TIMESTAMP
                 )
             """)
-            conn.commit()
+            # Lets ORDER BY name COLLATE NOCASE in the list queries read rows in index order instead of sorting
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_templates_name_nocase ON templates(name COLLATE NOCASE)")
         except sqlite3.Error as e:
-            print(f"Database initialization error: {e}")
+            logger.error("Database initialization error: %s", e)
+            self.close()
             raise # Re-raise after logging, as this is critical
-        finally:
-            if conn:
-                conn.close()
+
+    def close(self) -> None:
+        """Closes the shared database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        Yields a cursor inside BEGIN IMMEDIATE ... COMMIT. Rolls back if the block raises,
+        or if COMMIT itself fails (e.g. SQLITE_BUSY), so the connection never stays inside
+        an open transaction.
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+                cursor.execute("COMMIT")
+            except BaseException:
+                if self._conn.in_transaction:
+                    try:
+                        cursor.execute("ROLLBACK")
+                    except sqlite3.Error as rollback_error:
+                        logger.error("Rollback failed: %s", rollback_error)
+                raise
 
     def save_template(self, name: str, style_rules_dict: dict) -> Tuple[bool, str]:
         """
@@ -76,44 +186,108 @@ class TemplateManagerWin32:
         json_filename = f"{sanitized_name}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}.json"
         json_file_path = self.templates_dir / json_filename
 
+        # The filename lives in the DB (json_filename); it is not duplicated inside the file
         full_template_content = {
             "name": name,
-            "样式": style_rules_dict,
-            "_source_filename": json_filename # For self-reference if needed
+            "样式": style_rules_dict
         }
 
-        conn = None
         try:
-            # Save JSON file
-            with open(json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(full_template_content, f, ensure_ascii=False, indent=2)
-
-            # Save metadata to DB
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO templates (name, json_filename)
-                VALUES (?, ?)
-            """, (name, json_filename))
-            conn.commit()
-            new_id = cursor.lastrowid
+            # Serialize first and write once; json.dump would issue a write() per token
+            payload = _dumps_template_json(full_template_content)
+            with self._transaction() as cursor:
+                # Insert first; a duplicate name or filename is skipped (rowcount 0) before anything is written to disk
+                cursor.execute("""
+                    INSERT OR IGNORE INTO templates (name, json_filename)
+                    VALUES (?, ?)
+                """, (name, json_filename))
+                if cursor.rowcount == 0:
+                    return False, f"Failed to save template. A template with name '{name}' or filename '{json_filename}' might already exist."
+                new_id = cursor.lastrowid
+                # Still inside the transaction, so a failed file write rolls the row back
+                _write_bytes_atomic(json_file_path, payload)
             return True, f"Template '{name}' saved successfully with ID {new_id}."
 
-        except sqlite3.IntegrityError: # Handles UNIQUE constraint violation for name or json_filename
-            if json_file_path.exists(): # Clean up orphaned file if DB insert failed
-                try: os.remove(json_file_path)
-                except OSError: pass
-            return False, f"Failed to save template. A template with name '{name}' or filename '{json_filename}' might already exist."
-        except IOError as e:
+        except OSError as e:
             return False, f"Error saving template JSON file '{json_filename}': {e}"
-        except Exception as e: # Catch-all for other unexpected errors
-            if json_file_path.exists(): # Clean up
-                try: os.remove(json_file_path)
-                except OSError: pass
+        except Exception as e: # Catch-all for other unexpected errors (e.g. COMMIT failing after the file was written)
+            try: os.remove(json_file_path)
+            except OSError: pass
             return False, f"An unexpected error occurred while saving template: {e}"
-        finally:
-            if conn:
-                conn.close()
+
+    def save_templates_bulk(self, items: List[Tuple[str, dict]]) -> List[Tuple[bool, str]]:
+        """
+        Saves several templates at once: the JSON files are written in parallel, then all
+        metadata rows are inserted with one executemany in a single transaction.
+
+        Args:
+            items (List[Tuple[str, dict]]): (name, style_rules_dict) pairs, as for save_template.
+
+        Returns:
+            List[Tuple[bool, str]]: One (success, message) per item, in input order.
+        """
+        results: List[Optional[Tuple[bool, str]]] = [None] * len(items)
+
+        # Names that already exist are rejected up front with one query (chunked to stay under SQLite's variable limit)
+        candidate_names = list({name for name, _ in items if name})
+        existing_names = set()
+        try:
+            with self._lock:
+                for start in range(0, len(candidate_names), 500):
+                    chunk = candidate_names[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    existing_names.update(row[0] for row in self._conn.execute(
+                        f"SELECT name FROM templates WHERE name IN ({placeholders})", chunk))
+        except sqlite3.Error as e:
+            return [(False, f"Database error checking existing template names: {e}")] * len(items)
+
+        timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+        pending = [] # (item index, name, json_filename, payload)
+        seen_names = set()
+        for i, (name, style_rules_dict) in enumerate(items):
+            if not name:
+                results[i] = (False, "Template name cannot be empty.")
+            elif not isinstance(style_rules_dict, dict):
+                results[i] = (False, "Style rules must be a dictionary.")
+            elif name in existing_names or name in seen_names:
+                results[i] = (False, f"Failed to save template. A template with name '{name}' already exists.")
+            else:
+                seen_names.add(name)
+                # The item index keeps filenames unique when several names sanitize to the same string
+                json_filename = f"{self._sanitize_filename(name)}_{timestamp}_{i}.json"
+                payload = _dumps_template_json({"name": name, "样式": style_rules_dict})
+                pending.append((i, name, json_filename, payload))
+
+        def _write(entry) -> Optional[OSError]:
+            try:
+                _write_bytes_atomic(self.templates_dir / entry[2], entry[3])
+                return None
+            except OSError as e:
+                return e
+
+        written = []
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(8, len(pending))) as executor:
+                write_errors = list(executor.map(_write, pending))
+            for entry, error in zip(pending, write_errors):
+                if error is None:
+                    written.append(entry)
+                else:
+                    results[entry[0]] = (False, f"Error saving template JSON file '{entry[2]}': {error}")
+
+        if written:
+            try:
+                with self._transaction() as cursor:
+                    cursor.executemany("INSERT INTO templates (name, json_filename) VALUES (?, ?)",
+                                       [(name, json_filename) for _, name, json_filename, _ in written])
+                for i, name, _, _ in written:
+                    results[i] = (True, f"Template '{name}' saved successfully.")
+            except sqlite3.Error as e: # e.g. a concurrent save took one of the names; the whole batch was rolled back
+                for i, _, json_filename, _ in written:
+                    try: os.remove(self.templates_dir / json_filename)
+                    except OSError: pass
+                    results[i] = (False, f"Database error saving templates in bulk; batch rolled back: {e}")
+        return results
 
     def list_selectable_templates(self) -> List[Dict[str, Any]]:
         """
@@ -121,28 +295,33 @@ class TemplateManagerWin32:
 
         Returns:
             List[Dict[str, Any]]: A list of dictionaries, each containing
-                                  'id', 'name'.
+                                  'id', 'name' and 'json_filename'.
+        """
+        try:
+            with self._lock:
+                # Also select json_filename for debugging purposes
+                rows = self._conn.execute(
+                    "SELECT id, name, json_filename FROM templates ORDER BY name COLLATE NOCASE ASC"
+                ).fetchall()
+            # Build each dict once from the plain tuples (no sqlite3.Row -> dict copy)
+            return [{"id": tpl_id, "name": name, "json_filename": json_filename} for tpl_id, name, json_filename in rows]
+        except sqlite3.Error as e:
+            logger.error("Error listing templates: %s", e)
+            return []
+
+    def list_selectable_templates_light(self) -> List[Tuple[int, str]]:
+        """
+        Lightweight variant of list_selectable_templates for pickers that only need id and name.
+
+        Returns:
+            List[Tuple[int, str]]: (id, name) tuples, sorted case-insensitively by name.
         """
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            # Also select json_filename for debugging purposes
-            cursor.execute("SELECT id, name, json_filename FROM templates ORDER BY name COLLATE NOCASE ASC")
-            templates = []
-            for row in cursor.fetchall():
-                tpl_dict = dict(row)
-                # Add repr(name) for exact string representation
-                tpl_dict['name_repr'] = repr(tpl_dict['name'])
-                templates.append(tpl_dict)
-            return templates
+            with self._lock:
+                return self._conn.execute("SELECT id, name FROM templates ORDER BY name COLLATE NOCASE ASC").fetchall()
         except sqlite3.Error as e:
-            print(f"Error listing templates: {e}")
+            logger.error("Error listing templates: %s", e)
             return []
-        finally:
-            if conn:
-                conn.close()
 
     def load_template_json(self, template_id: Optional[int] = None, template_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
@@ -154,12 +333,12 @@ class TemplateManagerWin32:
                                          If both id and name are provided, id takes precedence.
         Returns:
             Optional[Dict[str, Any]]: The parsed JSON content of the template, or None if not found or error.
+                                      The dict is shared with the in-memory cache; treat it as read-only.
         """
         if template_id is None and template_name is None:
-            print("Error: template_id or template_name must be provided to load_template_json.")
+            logger.error("template_id or template_name must be provided to load_template_json.")
             return None
 
-        conn = None
         query = "SELECT json_filename FROM templates WHERE "
         params = []
 
@@ -171,35 +350,68 @@ class TemplateManagerWin32:
             params.append(template_name)
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(query, tuple(params))
-            row = cursor.fetchone()
+            with self._lock:
+                row = self._conn.execute(query, tuple(params)).fetchone()
 
             if row:
                 json_filename = row[0]
-                json_file_path = self.templates_dir / json_filename
-                if json_file_path.exists():
-                    with open(json_file_path, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                else:
-                    print(f"Error: Template file '{json_filename}' not found for template id/name: {template_id}/{template_name}.")
+                try:
+                    return self._load_template_by_filename(json_filename)
+                except FileNotFoundError:
+                    logger.error("Template file '%s' not found for template id/name: %s/%s.", json_filename, template_id, template_name)
                     return None
             else:
-                print(f"Error: No template found with id/name: {template_id}/{template_name}.")
+                logger.warning("No template found with id/name: %s/%s.", template_id, template_name)
                 return None
         except sqlite3.Error as e:
-            print(f"Database error loading template (id/name: {template_id}/{template_name}): {e}")
+            logger.error("Database error loading template (id/name: %s/%s): %s", template_id, template_name, e)
             return None
         except IOError as e:
-            print(f"File error loading template (id/name: {template_id}/{template_name}): {e}")
+            logger.error("File error loading template (id/name: %s/%s): %s", template_id, template_name, e)
             return None
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error for template (id/name: {template_id}/{template_name}): {e}")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e: # orjson.JSONDecodeError subclasses json.JSONDecodeError
+            logger.error("JSON decode error for template (id/name: %s/%s): %s", template_id, template_name, e)
             return None
-        finally:
-            if conn:
-                conn.close()
+
+    def load_all_templates(self) -> List[Dict[str, Any]]:
+        """
+        Loads every template: one query for the metadata, then the JSON files are read in parallel.
+
+        Returns:
+            List[Dict[str, Any]]: A list of dictionaries, each containing 'id', 'name', 'json_filename'
+                                  and 'content' (the parsed JSON, or None if the file could not be read).
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, name, json_filename FROM templates ORDER BY name COLLATE NOCASE ASC"
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Error listing templates for bulk load: %s", e)
+            return []
+        if not rows:
+            return []
+
+        def _read(json_filename: str) -> Optional[Dict[str, Any]]:
+            try:
+                return self._load_template_by_filename(json_filename)
+            except (OSError, ValueError) as e: # JSONDecodeError / UnicodeDecodeError are ValueErrors
+                logger.error("Error loading template file '%s': %s", json_filename, e)
+                return None
+
+        # File reads release the GIL, so a small pool overlaps the I/O
+        with ThreadPoolExecutor(max_workers=min(8, len(rows))) as executor:
+            contents = list(executor.map(_read, [row[2] for row in rows]))
+        return [
+            {"id": tpl_id, "name": name, "json_filename": json_filename, "content": content}
+            for (tpl_id, name, json_filename), content in zip(rows, contents)
+        ]
+
+    def _load_template_by_filename(self, json_filename: str) -> Dict[str, Any]:
+        """Reads and parses a template JSON file through the module-level (path, mtime) cache."""
+        abs_path = os.path.abspath(self.templates_dir / json_filename)
+        # stat() doubles as the existence check and provides the cache key
+        return _load_template_file(abs_path, os.stat(abs_path).st_mtime_ns)
 
     def delete_template(self, template_id: Optional[int] = None, template_name: Optional[str] = None) -> Tuple[bool, str]:
         """
@@ -208,7 +420,6 @@ class TemplateManagerWin32:
         if template_id is None and template_name is None:
             return False, "Template ID or name must be provided for deletion."
 
-        conn = None
         json_filename_to_delete = None
         
         select_query = "SELECT json_filename FROM templates WHERE "
@@ -225,24 +436,19 @@ class TemplateManagerWin32:
             params.append(template_name)
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            # First, get the filename to delete the file
-            cursor.execute(select_query, tuple(params))
-            row = cursor.fetchone()
-            if not row:
-                return False, f"Template not found for deletion (id/name: {template_id}/{template_name})."
-            json_filename_to_delete = row[0]
-
-            # Delete DB record
-            cursor.execute(delete_query, tuple(params))
-            if cursor.rowcount == 0:
-                # Should not happen if select found it, but as a safeguard
-                conn.rollback()
-                return False, f"Failed to delete template DB record (id/name: {template_id}/{template_name})."
-            
-            conn.commit()
+            with self._transaction() as cursor:
+                # First, get the filename to delete the file
+                cursor.execute(select_query, tuple(params))
+                row = cursor.fetchone()
+                if not row:
+                    return False, f"Template not found for deletion (id/name: {template_id}/{template_name})."
+                json_filename_to_delete = row[0]
+
+                # Delete DB record
+                cursor.execute(delete_query, tuple(params))
+                if cursor.rowcount == 0:
+                    # Should not happen if select found it, but as a safeguard
+                    return False, f"Failed to delete template DB record (id/name: {template_id}/{template_name})."
 
             # Delete JSON file
             if json_filename_to_delete:
@@ -260,14 +466,54 @@ class TemplateManagerWin32:
             return True, f"Template (id/name: {template_id}/{template_name}) deleted successfully."
 
         except sqlite3.Error as e:
-            if conn: conn.rollback()
             return False, f"Database error deleting template (id/name: {template_id}/{template_name}): {e}"
         except Exception as e:
-            if conn: conn.rollback()
             return False, f"Unexpected error deleting template (id/name: {template_id}/{template_name}): {e}"
-        finally:
-            if conn:
-                conn.close()
+
+    def delete_templates(self, template_ids: List[int]) -> List[Tuple[bool, str]]:
+        """
+        Deletes several templates by ID: all DB records are removed in one transaction,
+        then the JSON files are unlinked in parallel.
+
+        Returns:
+            List[Tuple[bool, str]]: One (success, message) per ID, in input order.
+        """
+        unique_ids = list(dict.fromkeys(template_ids))
+        filenames_by_id: Dict[int, str] = {}
+        try:
+            with self._transaction() as cursor:
+                for start in range(0, len(unique_ids), 500): # Stay under SQLite's variable limit
+                    chunk = unique_ids[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    filenames_by_id.update(cursor.execute(
+                        f"SELECT id, json_filename FROM templates WHERE id IN ({placeholders})", chunk).fetchall())
+                    cursor.execute(f"DELETE FROM templates WHERE id IN ({placeholders})", chunk)
+        except sqlite3.Error as e:
+            return [(False, f"Database error deleting templates: {e}")] * len(template_ids)
+
+        def _unlink(json_filename: str) -> Tuple[bool, str]:
+            try:
+                os.remove(self.templates_dir / json_filename)
+                return True, "deleted successfully."
+            except FileNotFoundError:
+                return True, f"DB record deleted. JSON file '{json_filename}' was not found."
+            except OSError as e:
+                return True, f"DB record deleted, but failed to delete JSON file '{json_filename}': {e}"
+
+        unlink_results: Dict[int, Tuple[bool, str]] = {}
+        if filenames_by_id:
+            deleted_ids = list(filenames_by_id)
+            with ThreadPoolExecutor(max_workers=min(8, len(deleted_ids))) as executor:
+                unlink_results = dict(zip(deleted_ids, executor.map(_unlink, [filenames_by_id[i] for i in deleted_ids])))
+
+        results = []
+        for template_id in template_ids:
+            if template_id in unlink_results:
+                success, detail = unlink_results[template_id]
+                results.append((success, f"Template (id: {template_id}) {detail}"))
+            else:
+                results.append((False, f"Template not found for deletion (id: {template_id})."))
+        return results
 
 if __name__ == '__main__':
     # Example Usage (assuming this script is in win32com/ and user_files is a sibling)
@@ -276,6 +522,7 @@ if __name__ == '__main__':
     
     # Determine base path for user_files relative to this script's location
     # This makes the __main__ example more robust if run directly.
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
     script_dir = Path(__file__).parent
     example_base_user_dir = script_dir / "user_files"
     print(f"Using base user directory for example: {example_base_user_dir.resolve()}")
@@ -0,0 +1,43 @@
+import json
+import types
+
+import pandas as pd
+
+from llm_mapper import LLMStyleMapper
+
+TEMPLATE = {"name": "t", "样式": {"prefix": "", "样式": {"正文": {}, "标题1": {}, "标题2": {}, "标题3": {}}}}
+
+
+def _fake_llm_client(sent_paragraphs: list):
+    """Sync client stand-in: records the paragraphs it is sent and answers 正文 for each."""
+    def create(**kwargs):
+        paragraphs = json.loads(kwargs["messages"][1]["content"])
+        sent_paragraphs.extend(paragraphs)
+        content = "\n".join(f"{p['idx']},正文" for p in paragraphs)
+        choice = types.SimpleNamespace(message=types.SimpleNamespace(content=content), finish_reason="stop")
+        return types.SimpleNamespace(choices=[choice])
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+
+def test_skip_high_confidence_maps_numbered_headings_to_template_styles():
+    sent_paragraphs = []
+    mapper = LLMStyleMapper(None, llm_client=_fake_llm_client(sent_paragraphs), template_data=TEMPLATE)
+    mapper.stream = False
+    mapper.response_cache_enabled = False
+    mapper.skip_high_confidence = True
+
+    doc_df = pd.DataFrame({
+        "paragraph_index": [0, 1, 2, 3, 4],
+        "text": ["1 绪论", "正文内容", "1.1 背景", "1.1.1 方法", "2.3.4.5 细节"],
+    })
+    mappings = mapper.generate_mapping(doc_df, 0, None, "t")
+
+    assert [(m["paragraph_index"], m["style"]) for m in mappings] == [
+        (0, "标题1"), (1, "正文"), (2, "标题2"), (3, "标题3"), (4, "标题3"),
+    ]
+    assert [p["idx"] for p in sent_paragraphs] == [1]
+
+
+if __name__ == "__main__":
+    test_skip_high_confidence_maps_numbered_headings_to_template_styles()
+    print("OK")
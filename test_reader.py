@@ -1,16 +1,18 @@
 print("--- test_reader.py script started ---", flush=True)
 import os
-import pythoncom # Important for explicit COM initialization/uninitialization in some contexts
-import pandas as pd # Import pandas for DataFrame display
-# If test_reader.py is in the win32com/ directory:
-from docx_reader_win32 import DocxReaderWin32
-# If test_reader.py is in the project root (one level above win32com/):
-# from win32com.docx_reader_win32 import DocxReaderWin32 
 
 def run_paragraph_extraction_test(file_path: str):
     """
     Tests the get_paragraph_data_df method of DocxReaderWin32.
     """
+    # Heavy imports are deferred until the test actually runs
+    import pythoncom # Important for explicit COM initialization/uninitialization in some contexts
+    import pandas as pd # Import pandas for DataFrame display
+    # If test_reader.py is in the win32com/ directory:
+    from docx_reader_win32 import DocxReaderWin32
+    # If test_reader.py is in the project root (one level above win32com/):
+    # from win32com.docx_reader_win32 import DocxReaderWin32 
+
     print("\n--- Starting Paragraph Extraction Test ---", flush=True)
     pythoncom.CoInitialize()
     reader = DocxReaderWin32()
@@ -32,7 +34,11 @@ def run_paragraph_extraction_test(file_path: str):
             df_full, middle_idx, back_idx = reader.get_paragraph_data_df(first_chapter_title="G1标题一") 
             
             print(f"\nFull DataFrame Info:", flush=True)
-            df_full.info(verbose=True, show_counts=True) # More verbose info
+            print(f"Shape: {df_full.shape}", flush=True)
+            print(df_full.dtypes, flush=True)
+            # info() counts non-nulls in every column; only worth the full scan on small documents
+            if len(df_full) < 1000:
+                df_full.info(verbose=True, show_counts=True)
             
             # Display a limited number of rows for brevity in console
             df_display = df_full.head(max_paragraphs_to_print)
@@ -54,19 +60,13 @@ def run_paragraph_extraction_test(file_path: str):
                 existing_cols_to_show = [col for col in cols_to_show if col in df_display.columns]
                 print(df_display[existing_cols_to_show])
 
-                if 'list_info' in df_display.columns:
-                    print(f"\nList Info for first {min(max_paragraphs_to_print, len(df_display))} paragraphs:", flush=True)
-                    for i in range(min(max_paragraphs_to_print, len(df_display))):
-                        para_idx_val = df_display.loc[df_display.index[i], 'paragraph_index']
-                        list_info_val = df_display.loc[df_display.index[i], 'list_info']
-                        print(f"  Para {para_idx_val}: {list_info_val}", flush=True)
-
-                if 'font_info' in df_display.columns:
-                    print(f"\nFont Info for first {min(max_paragraphs_to_print, len(df_display))} paragraphs:", flush=True)
-                    for i in range(min(max_paragraphs_to_print, len(df_display))):
-                         para_idx_val = df_display.loc[df_display.index[i], 'paragraph_index']
-                         font_info_val = df_display.loc[df_display.index[i], 'font_info']
-                         print(f"  Para {para_idx_val}: {font_info_val}", flush=True)
+                info_cols = [col for col in ('list_info', 'font_info') if col in df_display.columns]
+                if info_cols:
+                    print(f"\nList/Font Info for first {len(df_display)} paragraphs:", flush=True)
+                    # One itertuples pass instead of two .loc lookups per cell
+                    for para_idx_val, *info_vals in df_display[['paragraph_index', *info_cols]].itertuples(index=False, name=None):
+                        for col, val in zip(info_cols, info_vals):
+                            print(f"  Para {para_idx_val} {col}: {val}", flush=True)
             
             print(f"\nMiddle Start Index (for 'G1标题一'): {middle_idx}", flush=True)
 
@@ -1,6 +1,7 @@
 import streamlit as st
 import json
 from pathlib import Path
+from typing import Optional
 
 # --- Constants (copied and simplified from original ui_components.py) ---
 COMMON_FONTS_FAREAST = ["宋体", "黑体", "楷体", "仿宋", "微软雅黑", "华文仿宋"]
@@ -11,6 +12,8 @@ LINE_SPACING_RULES = {
     "single": "单倍行距 (倍)", "1.5 lines": "1.5 倍行距 (倍)", "double": "2 倍行距 (倍)",
     "exactly": "固定值 (磅)", "multiple": "多倍行距 (倍)"
 }
+# Line spacing rules whose value is implied by the rule itself
+FIXED_LS_VALUES = {"single": 1.0, "1.5 lines": 1.5, "double": 2.0}
 INDENT_UNITS = {"磅": "磅", "字符": "字符", "厘米": "厘米", "行": "行"} # Added 行
 
 FONT_SIZE_MAP_DISPLAY_TO_PT = {
@@ -18,7 +21,20 @@ FONT_SIZE_MAP_DISPLAY_TO_PT = {
     "小三": 15.0, "三号": 16.0, "小二": 18.0, "二号": 22.0, "小一": 24.0,
     "一号": 26.0, "小初": 36.0, "初号": 42.0
 }
-FONT_SIZE_MAP_PT_TO_DISPLAY = {v: k for k, v in FONT_SIZE_MAP_DISPLAY_TO_PT.items()}
+# Keyed by tenths of a point so sizes read back from JSON (e.g. 11.999999) still resolve
+FONT_SIZE_MAP_TENTH_TO_DISPLAY = {int(round(v * 10)): k for k, v in FONT_SIZE_MAP_DISPLAY_TO_PT.items()}
+
+# Selectbox options and key -> index lookups, built once instead of on every Streamlit rerun
+LINE_SPACING_KEYS = tuple(LINE_SPACING_RULES)
+LS_KEY_INDEX = {k: i for i, k in enumerate(LINE_SPACING_KEYS)}
+INDENT_UNIT_KEYS = tuple(INDENT_UNITS)
+IU_INDEX = {k: i for i, k in enumerate(INDENT_UNIT_KEYS)}
+ALIGN_KEYS = tuple(ALIGNMENT_OPTIONS)
+ALIGN_INDEX = {k: i for i, k in enumerate(ALIGN_KEYS)}
+FAREAST_IDX = {f: i for i, f in enumerate(COMMON_FONTS_FAREAST)}
+ASCII_IDX = {f: i for i, f in enumerate(FONTS_FOR_ASCII_DROPDOWN)}
+FONT_SIZE_KEYS = tuple(FONT_SIZE_MAP_DISPLAY_TO_PT)
+FONT_SIZE_INDEX = {k: i for i, k in enumerate(FONT_SIZE_KEYS)}
 
 # --- UI Rendering Functions (Simplified for win32com version) ---
 
@@ -48,7 +64,7 @@ def render_font_options(key_prefix: str, default_font_config: dict):
         if default_fareast not in COMMON_FONTS_FAREAST: default_fareast = "宋体"
         font_config['中文字体'] = st.selectbox(
             "中文字体", COMMON_FONTS_FAREAST, 
-            index=COMMON_FONTS_FAREAST.index(default_fareast), 
+            index=FAREAST_IDX[default_fareast], 
             key=f"{key_prefix}_font_fareast"
         )
         font_config['名称'] = font_config['中文字体'] # Main font is East Asian
@@ -58,18 +74,18 @@ def render_font_options(key_prefix: str, default_font_config: dict):
         if default_ascii not in FONTS_FOR_ASCII_DROPDOWN: default_ascii = "Times New Roman"
         font_config['西文字体'] = st.selectbox(
             "西文字体", FONTS_FOR_ASCII_DROPDOWN, 
-            index=FONTS_FOR_ASCII_DROPDOWN.index(default_ascii), 
+            index=ASCII_IDX[default_ascii], 
             key=f"{key_prefix}_font_ascii"
         )
 
     with cols[2]:
-        default_pt_size = float(default_font_config.get('大小', 12.0))
-        default_display_size = FONT_SIZE_MAP_PT_TO_DISPLAY.get(default_pt_size, '小四')
+        default_size_tenths = int(round(float(default_font_config.get('大小', 12.0)) * 10))
+        default_display_size = FONT_SIZE_MAP_TENTH_TO_DISPLAY.get(default_size_tenths, '小四')
         if default_display_size not in FONT_SIZE_MAP_DISPLAY_TO_PT: default_display_size = '小四'
         
         selected_display_size = st.selectbox(
-            "大小", options=list(FONT_SIZE_MAP_DISPLAY_TO_PT.keys()),
-            index=list(FONT_SIZE_MAP_DISPLAY_TO_PT.keys()).index(default_display_size),
+            "大小", options=FONT_SIZE_KEYS,
+            index=FONT_SIZE_INDEX[default_display_size],
             key=f"{key_prefix}_font_size_display"
         )
         font_config['大小'] = selected_display_size # Store display name, helper will convert
@@ -93,8 +109,11 @@ def render_font_options(key_prefix: str, default_font_config: dict):
 
     return font_config
 
-def render_paragraph_options(key_prefix: str, default_para_config: dict):
-    """Renders paragraph configuration options for a style."""
+def render_paragraph_options(key_prefix: str, default_para_config: dict, default_align: Optional[str] = None):
+    """Renders paragraph configuration options for a style.
+
+    default_align overrides default_para_config['对齐'] (alignment lives at the top level of a style).
+    """
     para_config = {'行间距': {}, '段前': {}, '段后': {}, '首行缩进': {}}
     if default_para_config is None: default_para_config = {}
 
@@ -105,9 +124,9 @@ def render_paragraph_options(key_prefix: str, default_para_config: dict):
         if default_ls_rule_key not in LINE_SPACING_RULES: default_ls_rule_key = 'single'
         
         selected_ls_rule_key = st.selectbox(
-            "规则", options=list(LINE_SPACING_RULES.keys()),
+            "规则", options=LINE_SPACING_KEYS,
             format_func=lambda k: LINE_SPACING_RULES[k],
-            index=list(LINE_SPACING_RULES.keys()).index(default_ls_rule_key),
+            index=LS_KEY_INDEX[default_ls_rule_key],
             key=f"{key_prefix}_para_ls_rule"
         )
         para_config['行间距']['规则key'] = selected_ls_rule_key
@@ -129,13 +148,12 @@ def render_paragraph_options(key_prefix: str, default_para_config: dict):
             if default_ls_unit != "倍": current_value = 1.15
         else: # single, 1.5 lines, double
             current_unit = "倍"
-            fixed_values = {"single": 1.0, "1.5 lines": 1.5, "double": 2.0}
-            current_value = fixed_values[selected_ls_rule_key]
+            current_value = FIXED_LS_VALUES[selected_ls_rule_key]
         
         para_config['行间距']['值'] = st.number_input(
             "值", min_value=0.0, value=current_value, step=step,
             key=f"{key_prefix}_para_ls_value",
-            disabled=(selected_ls_rule_key in ["single", "1.5 lines", "double"]) # Disable for fixed rules
+            disabled=(selected_ls_rule_key in FIXED_LS_VALUES) # Disable for fixed rules
         )
         para_config['行间距']['单位'] = current_unit
         st.caption(f"单位: {current_unit}")
@@ -145,8 +163,8 @@ def render_paragraph_options(key_prefix: str, default_para_config: dict):
         default_sb_unit = default_para_config.get('段前', {}).get('单位', '行')
         if default_sb_unit not in INDENT_UNITS: default_sb_unit = '行'
         para_config['段前']['单位'] = st.selectbox(
-            "单位 ", options=list(INDENT_UNITS.keys()),
-            index=list(INDENT_UNITS.keys()).index(default_sb_unit),
+            "单位 ", options=INDENT_UNIT_KEYS,
+            index=IU_INDEX[default_sb_unit],
             key=f"{key_prefix}_para_before_unit"
         )
         para_config['段前']['值'] = st.number_input(
@@ -160,8 +178,8 @@ def render_paragraph_options(key_prefix: str, default_para_config: dict):
         default_sa_unit = default_para_config.get('段后', {}).get('单位', '行')
         if default_sa_unit not in INDENT_UNITS: default_sa_unit = '行'
         para_config['段后']['单位'] = st.selectbox(
-            "单位  ", options=list(INDENT_UNITS.keys()),
-            index=list(INDENT_UNITS.keys()).index(default_sa_unit),
+            "单位  ", options=INDENT_UNIT_KEYS,
+            index=IU_INDEX[default_sa_unit],
             key=f"{key_prefix}_para_after_unit"
         )
         para_config['段后']['值'] = st.number_input(
@@ -175,8 +193,8 @@ def render_paragraph_options(key_prefix: str, default_para_config: dict):
         default_fli_unit = default_para_config.get('首行缩进', {}).get('单位', '字符')
         if default_fli_unit not in INDENT_UNITS: default_fli_unit = '字符'
         para_config['首行缩进']['单位'] = st.selectbox(
-            "单位   ", options=list(INDENT_UNITS.keys()),
-            index=list(INDENT_UNITS.keys()).index(default_fli_unit),
+            "单位   ", options=INDENT_UNIT_KEYS,
+            index=IU_INDEX[default_fli_unit],
             key=f"{key_prefix}_para_indent_unit"
         )
         para_config['首行缩进']['值'] = st.number_input(
@@ -185,12 +203,12 @@ def render_paragraph_options(key_prefix: str, default_para_config: dict):
             step=0.1, key=f"{key_prefix}_para_indent_value"
         )
 
-    default_align = default_para_config.get('对齐', 'left')
+    if default_align is None: default_align = default_para_config.get('对齐', 'left')
     if default_align not in ALIGNMENT_OPTIONS: default_align = 'left'
     para_config['对齐'] = st.selectbox(
-        "对齐方式", options=list(ALIGNMENT_OPTIONS.keys()),
+        "对齐方式", options=ALIGN_KEYS,
         format_func=lambda k: ALIGNMENT_OPTIONS[k],
-        index=list(ALIGNMENT_OPTIONS.keys()).index(default_align),
+        index=ALIGN_INDEX[default_align],
         key=f"{key_prefix}_para_align"
     )
     return para_config
@@ -207,9 +225,10 @@ def render_style_section(style_internal_name: str, display_name: str, default_st
 
         st.markdown("##### 段落")
         default_para = default_style_config.get('段落', {})
-        # Merge '对齐' from top level into default_para for render_paragraph_options
-        default_para_merged = {**default_para, '对齐': default_style_config.get('对齐', 'left')}
-        paragraph_settings = render_paragraph_options(style_internal_name, default_para_merged)
+        # Pass the top-level '对齐' alongside default_para instead of building a merged copy on every rerun
+        paragraph_settings = render_paragraph_options(
+            style_internal_name, default_para, default_align=default_style_config.get('对齐', 'left')
+        )
         
         style_config['对齐'] = paragraph_settings.pop('对齐') # Move alignment back to top level of style
         style_config['段落'] = paragraph_settings
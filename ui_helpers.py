@@ -1,10 +1,11 @@
 import json
+from operator import itemgetter
 from pathlib import Path
 import streamlit as st # For type hinting if needed, not for direct use here
 
 # Attempt to import from the local ui_components within the win32com package
 try:
-    from ui_components import FONT_SIZE_MAP_DISPLAY_TO_PT, LINE_SPACING_RULES
+    from ui_components import FONT_SIZE_MAP_DISPLAY_TO_PT, LINE_SPACING_RULES, FIXED_LS_VALUES
 except ImportError:
     # Fallback if run directly or import fails, though in app context this should work.
     print("警告 (ui_helpers.py): 无法从 ui_components 导入常量，将使用备用定义。")
@@ -17,6 +18,7 @@ except ImportError:
         "single": "单倍行距 (倍)", "1.5 lines": "1.5 倍行距 (倍)", "double": "2 倍行距 (倍)",
         "exactly": "固定值 (磅)", "multiple": "多倍行距 (倍)"
     }
+    FIXED_LS_VALUES = {"single": 1.0, "1.5 lines": 1.5, "double": 2.0}
 
 def _to_float(value, default=0.0):
     try:
@@ -24,6 +26,21 @@ def _to_float(value, default=0.0):
     except (ValueError, TypeError):
         return default
 
+def _ff(value, default=0.0):
+    """_to_float with a fast path for values that are already float (st.number_input always returns float)."""
+    return value if type(value) is float else _to_float(value, default)
+
+# Fields read from render_font_options / render_paragraph_options output. The widgets always fill
+# every key, so these are read by direct indexing; partial dicts (e.g. older saved data) fall back
+# to being merged over the defaults below.
+_FONT_UI_DEFAULTS = {
+    '中文字体': '宋体', '西文字体': 'Times New Roman', '大小': '小四', '颜色': '#000000',
+    '粗体': False, '斜体': False, '下划线': False
+}
+_get_font_ui_fields = itemgetter(*_FONT_UI_DEFAULTS)
+_LS_UI_DEFAULTS = {'规则key': 'single', '值': 1.0, '单位': '倍'}
+_get_ls_ui_fields = itemgetter(*_LS_UI_DEFAULTS)
+
 def _to_int(value, default=0):
     try:
         return int(value)
@@ -58,24 +75,31 @@ def form_data_to_json_win32(basic_info: dict, styles_data: dict, toc_data: dict,
     output_json['template_type'] = 'win32com_manual' 
 
     # 2. Main Styles ("样式")
+    # Local aliases for the per-style loop
+    to_float = _ff
+    font_size_pt = FONT_SIZE_MAP_DISPLAY_TO_PT.get
+    ls_rule_name = LINE_SPACING_RULES.get
     processed_styles = {}
     for style_key, style_config_from_ui in styles_data.items():
         processed_style = {}
         
         # Font processing
         font_ui = style_config_from_ui.get('字体', {})
-        font_json = {
-            '中文字体': font_ui.get('中文字体', '宋体'),
-            '西文字体': font_ui.get('西文字体', 'Times New Roman'),
-            '颜色': font_ui.get('颜色', '#000000'),
-            '粗体': bool(font_ui.get('粗体', False)),
-            '斜体': bool(font_ui.get('斜体', False)),
-            '下划线': bool(font_ui.get('下划线', False)) # Assuming boolean, adjust if complex
+        try:
+            fareast_font, ascii_font, display_size, color, bold, italic, underline = _get_font_ui_fields(font_ui)
+        except KeyError:
+            fareast_font, ascii_font, display_size, color, bold, italic, underline = _get_font_ui_fields({**_FONT_UI_DEFAULTS, **font_ui})
+        size_pt = font_size_pt(display_size, 12.0) # display_size is the display name e.g. "小四"
+        processed_style['字体'] = {
+            '中文字体': fareast_font,
+            '西文字体': ascii_font,
+            '颜色': color,
+            '粗体': bool(bold),
+            '斜体': bool(italic),
+            '下划线': bool(underline), # Assuming boolean, adjust if complex
+            '大小': to_float(size_pt, 12.0),
+            '名称': fareast_font, # As per ui_components logic
         }
-        display_size = font_ui.get('大小', '小四') # This is display name e.g. "小四"
-        font_json['大小'] = _to_float(FONT_SIZE_MAP_DISPLAY_TO_PT.get(display_size, 12.0))
-        font_json['名称'] = font_json['中文字体'] # As per ui_components logic
-        processed_style['字体'] = font_json
 
         # Paragraph processing
         para_ui = style_config_from_ui.get('段落', {})
@@ -86,32 +110,32 @@ def form_data_to_json_win32(basic_info: dict, styles_data: dict, toc_data: dict,
 
         # Line Spacing
         ls_ui = para_ui.get('行间距', {})
-        ls_rule_key = ls_ui.get('规则key', 'single')
-        ls_value_input = _to_float(ls_ui.get('值'), 1.0) # User input or calculated default
-        ls_unit_from_ui = ls_ui.get('单位', '倍') # Unit determined by UI based on rule
+        try:
+            ls_rule_key, ls_value_input, ls_unit_from_ui = _get_ls_ui_fields(ls_ui)
+        except KeyError:
+            ls_rule_key, ls_value_input, ls_unit_from_ui = _get_ls_ui_fields({**_LS_UI_DEFAULTS, **ls_ui})
+        ls_value_input = to_float(ls_value_input, 1.0) # User input or calculated default
+        # ls_unit_from_ui: unit determined by UI based on rule
 
         ls_json = {"单位": ls_unit_from_ui}
         if ls_rule_key in ["exactly", "multiple"]: # "at least" removed
             ls_json["值"] = ls_value_input
-            ls_json["规则"] = LINE_SPACING_RULES.get(ls_rule_key, ls_rule_key)
+            ls_json["规则"] = ls_rule_name(ls_rule_key, ls_rule_key)
         else: # single, 1.5 lines, double - value is fixed by rule
-            fixed_values = {"single": 1.0, "1.5 lines": 1.5, "double": 2.0}
-            ls_json["值"] = fixed_values.get(ls_rule_key, 1.0)
+            ls_json["值"] = FIXED_LS_VALUES.get(ls_rule_key, 1.0)
             # "规则" field is not strictly needed for these as value implies rule
         para_json['行间距'] = ls_json
         
         # Spacing (段前, 段后)
-        for space_key_zh, space_key_en in [("段前", "段前"), ("段后", "段后")]:
-            space_ui = para_ui.get(space_key_zh, {})
-            para_json[space_key_zh] = {
-                "值": _to_float(space_ui.get('值'), 0.0),
-                "单位": space_ui.get('单位', '行')
-            }
+        space_before_ui = para_ui.get('段前', {})
+        para_json['段前'] = {"值": to_float(space_before_ui.get('值'), 0.0), "单位": space_before_ui.get('单位', '行')}
+        space_after_ui = para_ui.get('段后', {})
+        para_json['段后'] = {"值": to_float(space_after_ui.get('值'), 0.0), "单位": space_after_ui.get('单位', '行')}
         
         # Indentation (首行缩进)
         indent_ui = para_ui.get('首行缩进', {})
         para_json['首行缩进'] = {
-            "值": _to_float(indent_ui.get('值'), 2.0),
+            "值": to_float(indent_ui.get('值'), 2.0),
             "单位": indent_ui.get('单位', '字符')
         }
         # Add left/right indent if they are part of the UI and data structure
@@ -128,26 +152,28 @@ def form_data_to_json_win32(basic_info: dict, styles_data: dict, toc_data: dict,
     output_json['样式'] = processed_styles
 
     # 3. TOC Data (Simplified - pass through what ui_components.render_toc_section collects)
-    # Ensure numeric types are correct.
+    # Ensure numeric types are correct (Streamlit number_input values are already float).
     cleaned_toc_data = {}
     ui_toc_title = toc_data.get('toc_title_style', {})
     if ui_toc_title.get('font'):
-        ui_toc_title['font']['size'] = _to_float(ui_toc_title['font'].get('size'), 18.0)
+        ui_toc_title['font']['size'] = _ff(ui_toc_title['font'].get('size'), 18.0)
     if ui_toc_title.get('paragraph'):
-        ui_toc_title['paragraph']['space_before_pt'] = _to_float(ui_toc_title['paragraph'].get('space_before_pt'), 9.0)
-        ui_toc_title['paragraph']['space_after_pt'] = _to_float(ui_toc_title['paragraph'].get('space_after_pt'), 9.0)
-        ui_toc_title['paragraph']['line_spacing'] = _to_float(ui_toc_title['paragraph'].get('line_spacing'), 1.0)
+        ui_toc_title['paragraph']['space_before_pt'] = _ff(ui_toc_title['paragraph'].get('space_before_pt'), 9.0)
+        ui_toc_title['paragraph']['space_after_pt'] = _ff(ui_toc_title['paragraph'].get('space_after_pt'), 9.0)
+        ui_toc_title['paragraph']['line_spacing'] = _ff(ui_toc_title['paragraph'].get('line_spacing'), 1.0)
     cleaned_toc_data['toc_title_style'] = ui_toc_title
 
     cleaned_toc_styles = {}
     for key, entry_style in toc_data.get('toc_styles', {}).items():
-        cleaned_entry = entry_style.copy()
+        # Cleaned in place like toc_title_style above: a shallow copy would still share the nested dicts being updated
+        cleaned_entry = entry_style
         if cleaned_entry.get('font'):
-            cleaned_entry['font']['size'] = _to_float(cleaned_entry['font'].get('size'), 12.0)
+            cleaned_entry['font']['size'] = _ff(cleaned_entry['font'].get('size'), 12.0)
         if cleaned_entry.get('paragraph'):
-            cleaned_entry['paragraph']['line_spacing'] = _to_float(cleaned_entry['paragraph'].get('line_spacing'), 22.0) # Example default
-        if cleaned_entry.get('tabs') and isinstance(cleaned_entry['tabs'], list) and cleaned_entry['tabs']:
-            cleaned_entry['tabs'][0]['position_cm'] = _to_float(cleaned_entry['tabs'][0].get('position_cm'), 16.0)
+            cleaned_entry['paragraph']['line_spacing'] = _ff(cleaned_entry['paragraph'].get('line_spacing'), 22.0) # Example default
+        tabs = cleaned_entry.get('tabs')
+        if tabs: # a list of tab stop dicts, as produced by the TOC defaults
+            tabs[0]['position_cm'] = _ff(tabs[0].get('position_cm'), 16.0)
         cleaned_toc_styles[key] = cleaned_entry
     cleaned_toc_data['toc_styles'] = cleaned_toc_styles
     # cleaned_toc_data['prefix'] = toc_data.get('prefix', '自定义') # prefix is being removed
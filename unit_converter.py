@@ -1,12 +1,47 @@
 # unit_converter.py
 
+import functools
 import re
+import sys
 from typing import Union, Optional, Tuple, Any
 
 # Conversion constants
 CM_TO_PT = 28.3464567
 INCH_TO_PT = 72.0
 
+# isinstance() target for numeric inputs. A module-level tuple avoids rebuilding (int, float)
+# from two builtin lookups on every call, and unlike a type() check it still accepts bool and
+# float subclasses such as numpy.float64 from DataFrame rows
+_NUMERIC_TYPES = (int, float)
+
+# Canonical names for the units parse_value recognizes (input is lowercased first);
+# any other unit string is passed through unchanged
+_UNIT_NORMALIZE = {
+    '倍': 'multiple', 'multiple': 'multiple',
+    '行': 'line', 'line': 'line',
+    '磅': 'pt', 'pt': 'pt',
+    '厘米': 'cm', 'cm': 'cm',
+    '英寸': 'inch', 'inch': 'inch',
+    '字符': 'char', 'char': 'char',
+}
+
+# Canonical unit names, interned so that equality checks and dict lookups on parsed units
+# downstream hit the identity fast path (regex group names are not interned on their own)
+_INTERNED_UNITS = {u: sys.intern(u) for u in ('pt', 'multiple', 'line', 'cm', 'inch', 'char', 'twips')}
+
+# Canonical unit -> spellings matched directly by the value/unit regexes as named groups, so the
+# match itself reports the canonical unit. Other casings ("PT") and unknown units fall through to
+# the 'other' group, which is lowercased and looked up in _UNIT_NORMALIZE as before
+_UNIT_ALTERNATIVES = {
+    'multiple': 'multiple|倍', 'line': 'line|行', 'pt': 'pt|磅',
+    'cm': 'cm|厘米', 'inch': 'inch|英寸', 'char': 'char|字符',
+}
+
+def _value_unit_pattern(unit_chars: str) -> str:
+    """Builds a value/unit regex whose 'other' unit group accepts the characters in unit_chars."""
+    units = '|'.join(f'(?P<{name}>{spellings})' for name, spellings in _UNIT_ALTERNATIVES.items())
+    return rf"^\s*(-?\d+(?:\.\d+)?)\s*(?:{units}|(?P<other>[{unit_chars}]+))?\s*$"
+
 class UnitConversionError(ValueError):
     """Custom exception for unit conversion errors."""
     pass
@@ -19,7 +54,10 @@ class UnitConverter:
 
     # Regex to parse values like "12pt", "1.5 倍", "10 cm", "2 字符"
     # Allows optional space between value and unit
-    _VALUE_UNIT_REGEX = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*([a-zA-Z\u4e00-\u9fa5]+)?\s*$")
+    _VALUE_UNIT_REGEX = re.compile(_value_unit_pattern("a-zA-Z\u4e00-\u9fa5"))
+    # Same pattern with an ASCII-only unit class, used for pure-ASCII inputs ("12pt", "1.5").
+    # Compiled without re.ASCII: \s must still match \x1c-\x1f like the Unicode pattern does
+    _ASCII_VALUE_UNIT_REGEX = re.compile(_value_unit_pattern("a-zA-Z"))
 
     def parse_value(self, value: Any) -> Tuple[Optional[float], Optional[str]]:
         """
@@ -39,62 +77,152 @@ class UnitConverter:
         numeric_value: Optional[float] = None
         unit_str: Optional[str] = None
 
-        if isinstance(value, (int, float)):
+        if isinstance(value, _NUMERIC_TYPES):
             numeric_value = float(value)
             # Unit is implicitly None unless context suggests otherwise (handled in comparison logic)
         elif isinstance(value, dict) and '值' in value and '单位' in value:
             # Handle dictionary format {'值': V, '单位': U}
             raw_val = value['值']
             raw_unit = value['单位']
-            if isinstance(raw_val, (int, float)):
+            if isinstance(raw_val, _NUMERIC_TYPES):
                 numeric_value = float(raw_val)
                 if isinstance(raw_unit, str):
                     unit_str = raw_unit.lower()
-                    # Normalize common units (same logic as below)
-                    if unit_str in ['倍', 'multiple']: unit_str = 'multiple'
-                    elif unit_str in ['行', 'line']: unit_str = 'line'
-                    elif unit_str in ['磅', 'pt']: unit_str = 'pt'
-                    elif unit_str in ['厘米', 'cm']: unit_str = 'cm'
-                    elif unit_str in ['英寸', 'inch']: unit_str = 'inch'
-                    elif unit_str in ['字符', 'char']: unit_str = 'char'
-                    # else: keep other units as is
+                    # Normalize common units; keep other units as is
+                    unit_str = _UNIT_NORMALIZE.get(unit_str, unit_str)
                 # else: unit is not a string, keep unit_str as None
             # else: value is not numeric, keep numeric_value as None
         elif isinstance(value, str):
-            match = self._VALUE_UNIT_REGEX.match(value.strip())
-            if match:
-                try:
-                    numeric_value = float(match.group(1))
-                    unit_str = match.group(2)
-                    if unit_str:
-                        unit_str = unit_str.lower()
-                        # Normalize common units
-                        if unit_str in ['倍', 'multiple']:
-                            unit_str = 'multiple'
-                        elif unit_str in ['行', 'line']:
-                            unit_str = 'line'
-                        elif unit_str in ['磅', 'pt']:
-                            unit_str = 'pt'
-                        elif unit_str in ['厘米', 'cm']:
-                            unit_str = 'cm'
-                        elif unit_str in ['英寸', 'inch']:
-                            unit_str = 'inch'
-                        elif unit_str in ['字符', 'char']:
-                            unit_str = 'char'
-                        # Keep other units as is for now (e.g., 'twip' if encountered)
-                except (ValueError, TypeError):
-                    numeric_value = None
-                    unit_str = None
-            else:
-                 # Handle case where string might just be a number "12"
-                 try:
-                     numeric_value = float(value.strip())
-                 except ValueError:
-                     numeric_value = None # Cannot parse as number
+            numeric_value, unit_str = self._parse_str(value.strip())
         # else: other types are not supported
 
         return numeric_value, unit_str
 
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _parse_str(value: str) -> Tuple[Optional[float], Optional[str]]:
+        """
+        String branch of parse_value, memoized on the stripped input: template and document
+        values repeat a small set of strings ("12pt", "1.5 倍", ...).
+        """
+        numeric_value: Optional[float] = None
+        unit_str: Optional[str] = None
+        # On ASCII input both patterns match identically; choosing up front avoids a second attempt
+        if value.isascii():
+            match = UnitConverter._ASCII_VALUE_UNIT_REGEX.match(value)
+        else:
+            match = UnitConverter._VALUE_UNIT_REGEX.match(value)
+        if match:
+            try:
+                numeric_value = float(match.group(1))
+                # lastgroup is the canonical unit name, 'other', or None when no unit was given
+                unit_str = match.lastgroup
+                if unit_str == 'other':
+                    unit_str = match.group('other').lower()
+                    # Normalize common units; keep other units as is for now (e.g., 'twip' if encountered)
+                    unit_str = _UNIT_NORMALIZE.get(unit_str, unit_str)
+                if unit_str is not None:
+                    unit_str = _INTERNED_UNITS.get(unit_str, unit_str)
+            except (ValueError, TypeError):
+                numeric_value = None
+                unit_str = None
+        else:
+             # Handle case where string might just be a number "12"
+             try:
+                 numeric_value = float(value)
+             except ValueError:
+                 numeric_value = None # Cannot parse as number
+        return numeric_value, unit_str
+
+    def fast_to_pt(self, value: Any, font_size_pt: Optional[Union[int, float]] = None) -> Optional[float]:
+        """
+        Equivalent to parse_value followed by convert_value(..., 'pt'), specialized for the common
+        case of a bare number already in points (from_unit None or 'pt'): plain int/float inputs
+        skip parsing and unit dispatch entirely. Other inputs ("1 cm", {'值': 2, '单位': '字符'})
+        take the full path.
+
+        Returns:
+            The value in points, or None if it cannot be parsed or converted.
+
+        Raises:
+            UnitConversionError: As convert_value (e.g. 'char' without font_size_pt).
+        """
+        value_type = type(value)
+        if value_type is float:
+            return value
+        if value_type is int:
+            return float(value)
+        numeric_value, unit_str = self.parse_value(value)
+        if numeric_value is None:
+            return None
+        return self.convert_value(numeric_value, unit_str, 'pt', font_size_pt=font_size_pt)
+
+    def fast_to_multiple(self, value: Any) -> Optional[float]:
+        """
+        Equivalent to parse_value followed by convert_value(..., 'multiple'), specialized for bare
+        int/float line-spacing multiples (from_unit None or 'multiple').
+
+        Returns:
+            The value as a multiple, or None if it cannot be parsed or is an absolute unit.
+
+        Raises:
+            UnitConversionError: As convert_value (unsupported unit).
+        """
+        value_type = type(value)
+        if value_type is float:
+            return value
+        if value_type is int:
+            return float(value)
+        numeric_value, unit_str = self.parse_value(value)
+        if numeric_value is None:
+            return None
+        return self.convert_value(numeric_value, unit_str, 'multiple')
+
+    def _to_pt(self,
+               value: Union[int, float],
+               from_unit_lower: Optional[str],
+               font_size_pt: Optional[Union[int, float]],
+               from_unit: Optional[str] = None
+              ) -> Optional[float]:
+        """
+        Converts to 'pt' for convert_value's 'pt' and 'twips' targets.
+        Expects arguments already validated by convert_value and from_unit already lowercased;
+        from_unit is only used in the error message.
+        """
+        # Treat '磅' (bang) the same as 'pt' since parse_value normalizes '磅' to 'pt'
+        # but here we might get '磅' directly from the template dict unit
+        if from_unit_lower in ['pt', '磅']:
+            return float(value)
+        elif from_unit_lower == 'cm':
+            return float(value) * CM_TO_PT
+        elif from_unit_lower == 'inch':
+            return float(value) * INCH_TO_PT
+        elif from_unit_lower in ['char', '字符']: # Accept both English and Chinese keys
+            if font_size_pt is None:
+                raise UnitConversionError("Font size (font_size_pt) is required for 'char'/'字符' to 'pt' conversion.")
+            if font_size_pt <= 0:
+                raise UnitConversionError("Font size must be positive for 'char' to 'pt' conversion.")
+            # Assuming 1 char width is approximately equal to the font size in points
+            return float(value) * float(font_size_pt)
+        elif from_unit_lower is None:
+             # If from_unit is None, assume it's already pt (common case for docx properties)
+             return float(value)
+        elif from_unit_lower in ['multiple', 'line']:
+            # Convert relative units (multiple/line) to absolute pt using font size
+            if font_size_pt is None:
+                 # Cannot convert without font size
+                 # print(f"  [DEBUG UnitConverter] Warning: Cannot convert '{from_unit_lower}' to 'pt' without font_size_pt.")
+                 return None
+            if font_size_pt <= 0:
+                 # print(f"  [DEBUG UnitConverter] Warning: Cannot convert '{from_unit_lower}' to 'pt' with non-positive font_size_pt: {font_size_pt}")
+                 return None
+            # Perform conversion: value * font_size
+            converted = float(value) * float(font_size_pt)
+            # print(f"  [DEBUG UnitConverter] Converted {value} {from_unit_lower} to {converted} pt using font size {font_size_pt}") # DEBUG
+            return converted
+        else:
+            raise UnitConversionError(f"Unsupported unit conversion from '{from_unit}' to 'pt'")
+
     def convert_value(self,
                       value: Union[int, float],
                       from_unit: Optional[str],
@@ -121,49 +249,18 @@ class UnitConverter:
                                  or if font_size_pt is invalid.
             TypeError: If value or font_size_pt (when provided) is not numeric.
         """
-        if not isinstance(value, (int, float)):
+        if not isinstance(value, _NUMERIC_TYPES):
             raise TypeError(f"Value must be numeric, got {type(value)}")
-        if font_size_pt is not None and not isinstance(font_size_pt, (int, float)):
+        if font_size_pt is not None and not isinstance(font_size_pt, _NUMERIC_TYPES):
              raise TypeError(f"font_size_pt must be numeric when provided, got {type(font_size_pt)}")
 
-        from_unit_lower = from_unit.lower() if isinstance(from_unit, str) else None
-        to_unit_lower = to_unit.lower() if isinstance(to_unit, str) else None
+        # Canonical names (as returned by parse_value) are already lowercase; skip lower() for them
+        from_unit_lower = (_INTERNED_UNITS.get(from_unit) or from_unit.lower()) if isinstance(from_unit, str) else None
+        to_unit_lower = (_INTERNED_UNITS.get(to_unit) or to_unit.lower()) if isinstance(to_unit, str) else None
 
         # --- Handle conversions TO 'pt' ---
         if to_unit_lower == 'pt':
-            # Treat '磅' (bang) the same as 'pt' since parse_value normalizes '磅' to 'pt'
-            # but here we might get '磅' directly from the template dict unit
-            if from_unit_lower in ['pt', '磅']:
-                return float(value)
-            elif from_unit_lower == 'cm':
-                return float(value) * CM_TO_PT
-            elif from_unit_lower == 'inch':
-                return float(value) * INCH_TO_PT
-            elif from_unit_lower in ['char', '字符']: # Accept both English and Chinese keys
-                if font_size_pt is None:
-                    raise UnitConversionError("Font size (font_size_pt) is required for 'char'/'字符' to 'pt' conversion.")
-                if font_size_pt <= 0:
-                    raise UnitConversionError("Font size must be positive for 'char' to 'pt' conversion.")
-                # Assuming 1 char width is approximately equal to the font size in points
-                return float(value) * float(font_size_pt)
-            elif from_unit_lower is None:
-                 # If from_unit is None, assume it's already pt (common case for docx properties)
-                 return float(value)
-            elif from_unit_lower in ['multiple', 'line']:
-                # Convert relative units (multiple/line) to absolute pt using font size
-                if font_size_pt is None:
-                     # Cannot convert without font size
-                     # print(f"  [DEBUG UnitConverter] Warning: Cannot convert '{from_unit_lower}' to 'pt' without font_size_pt.")
-                     return None
-                if font_size_pt <= 0:
-                     # print(f"  [DEBUG UnitConverter] Warning: Cannot convert '{from_unit_lower}' to 'pt' with non-positive font_size_pt: {font_size_pt}")
-                     return None
-                # Perform conversion: value * font_size
-                converted = float(value) * float(font_size_pt)
-                # print(f"  [DEBUG UnitConverter] Converted {value} {from_unit_lower} to {converted} pt using font size {font_size_pt}") # DEBUG
-                return converted
-            else:
-                raise UnitConversionError(f"Unsupported unit conversion from '{from_unit}' to 'pt'")
+            return self._to_pt(value, from_unit_lower, font_size_pt, from_unit)
 
         # --- Handle conversions TO 'multiple' ---
         elif to_unit_lower == 'multiple':
@@ -194,19 +291,17 @@ class UnitConverter:
  
         # --- Handle conversions TO 'twips' ---
         elif to_unit_lower == 'twips':
-            # First, convert the value to points (pt)
+            # First, convert the value to points (pt); inputs were validated above, so no re-dispatch
             try:
-                pt_value = self.convert_value(value, from_unit, 'pt', font_size_pt=font_size_pt)
-                if pt_value is None:
-                    # If conversion to pt failed (e.g., trying to convert 'multiple' without font size)
-                    return None
-                # Convert points to twips (1 pt = 20 twips)
-                return int(round(pt_value * 20)) # Return as integer
-            except (UnitConversionError, TypeError) as e:
-                # Re-raise or handle? For now, let the caller handle errors from the pt conversion step.
-                # Or return None? Let's return None to indicate failure.
-                # print(f"  [DEBUG UnitConverter] Error during intermediate pt conversion for twips: {e}")
+                pt_value = self._to_pt(value, from_unit_lower, font_size_pt, from_unit)
+            except UnitConversionError:
+                # Return None to indicate failure (e.g. 'char' without font size, unsupported unit)
+                return None
+            if pt_value is None:
+                # If conversion to pt failed (e.g., trying to convert 'multiple' without font size)
                 return None
+            # Convert points to twips (1 pt = 20 twips)
+            return int(round(pt_value * 20)) # Return as integer
  
         # --- Target unit not supported ---
         else:
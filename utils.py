@@ -1,3 +1,22 @@
+import re
+
+# 其他常见中文标点（注意 '""' 为 ASCII 双引号，其后的 '' 只是相邻字符串拼接）
+_CHINESE_PUNCTS = '。，、；：？！""''（）【】《》〈〉『』「」﹃﹄〔〕…—～﹏￥'
+# contains_cjk_characters 检查的全部字符范围合并为一个字符类，单次 C 层扫描
+_CJK_RE = re.compile(
+    '['
+    '\u4e00-\u9fff'  # 基本汉字和常用扩展
+    '\u3400-\u4dbf'  # CJK扩展A
+    '\uf900-\ufaff'  # CJK兼容汉字
+    '\u2e80-\u2eff'  # CJK部首扩展
+    '\u31c0-\u31ef'  # CJK笔画
+    '\u3000-\u303f'  # 中日韩符号和标点
+    # 全角ASCII、拉丁文字母和中文标点（FF00-FFEF）中的中文标点部分
+    '\uff01-\uff0f\uff1a-\uff20\uff3b-\uff40\uff5b-\uff65'
+    + re.escape(_CHINESE_PUNCTS) +
+    ']'
+)
+
 def contains_cjk_characters(text: str) -> bool:
     """
     检查文本是否包含中日韩(CJK)字符
@@ -18,45 +37,14 @@ def contains_cjk_characters(text: str) -> bool:
     Returns:
         是否包含CJK字符
     """
-    # 基本汉字和常用扩展
-    if any('\u4e00' <= char <= '\u9fff' for char in text):
-        return True
-    
-    # CJK扩展A
-    if any('\u3400' <= char <= '\u4dbf' for char in text):
-        return True
-    
-    # CJK兼容汉字
-    if any('\uf900' <= char <= '\ufaff' for char in text):
-        return True
-        
-    # CJK部首扩展
-    if any('\u2e80' <= char <= '\u2eff' for char in text):
-        return True
-        
-    # CJK笔画
-    if any('\u31c0' <= char <= '\u31ef' for char in text):
-        return True
-        
-    # 中日韩符号和标点
-    if any('\u3000' <= char <= '\u303f' for char in text):
-        return True
-        
-    # 全角ASCII、拉丁文字母和中文标点（FF00-FFEF）中的中文标点部分
-    if any(('\uff01' <= char <= '\uff0f') or ('\uff1a' <= char <= '\uff20') or 
-           ('\uff3b' <= char <= '\uff40') or ('\uff5b' <= char <= '\uff65') for char in text):
-        return True
-        
-    # 其他常见中文标点
-    chinese_puncts = '。，、；：？！""''（）【】《》〈〉『』「」﹃﹄〔〕…—～﹏￥'
-    if any(char in chinese_puncts for char in text):
-        return True
-        
-    return False
+    if text.isascii():
+        # ASCII 中唯一命中的是 _CHINESE_PUNCTS 里的 '"'，无需进入正则
+        return '"' in text
+    return _CJK_RE.search(text) is not None
 
+import functools
 import json
 import os
-import re #确保 re 已导入
 import unicodedata # 确保导入 unicodedata
 from typing import List
 
@@ -96,11 +84,44 @@ MATH_CHAR_NORM_MAP = {
     '~': '~', # Tilde, often used in math, ensure it's consistent
     # Consider other symbols like plus, minus, dot, etc. if they have multiple Unicode representations
 }
+@functools.lru_cache(maxsize=None)
+def _math_char_table(norm_form):
+    """
+    返回 normalize_text 在给定 Unicode 规范化形式下实际需要的 (字符集合, 转换表)。
+
+    规范化后的文本中不会再出现被该形式改写的字符（例如 NFKC 已将 '𝑎' 变为 'a'），
+    这类条目以及映射到自身的条目都可去掉；NFKC 下只剩 '≠'。
+    先用集合判断是否含需替换字符，多数文本可直接跳过 translate。
+    """
+    table = {
+        k: v for k, v in MATH_CHAR_NORM_MAP.items()
+        if k != v and (not norm_form or unicodedata.normalize(norm_form, k) == k)
+    }
+    return frozenset(table), str.maketrans(table)
+
+# [FORMULA:] 标记及其两侧可能的单个空格：一侧有空格时替换为一个空格，否则直接删除
+_FORMULA_RE = re.compile(r'( ?)\[FORMULA:\]( ?)')
+
+def _formula_repl(match: re.Match) -> str:
+    return ' ' if match.group(1) or match.group(2) else ''
 
 
 # 默认的标题样式列表，作为回退选项
 DEFAULT_HEADING_STYLES = ["标题一", "标题二", "标题三", "标题四"]
 
+# 标题级别排序用的正则与中文数字映射，模块加载时构建一次。
+# 单个正则同时匹配中文数字 "标题一" 和阿拉伯数字 "标题1"；中文分支在前，"标题二1" 仍按二级处理
+_HEADING_LEVEL_RE = re.compile(r'标题(?:([一二三四五六七八九])|(\d+))')
+_CN_NUM_MAP = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+
+def _get_heading_level(style_name: str) -> int:
+    """标题样式的排序键：返回标题级别，无法识别时返回 99 使其排在后面。"""
+    match = _HEADING_LEVEL_RE.search(style_name)
+    if match is None:
+        return 99
+    cn_digit, number = match.groups()
+    return _CN_NUM_MAP[cn_digit] if cn_digit else int(number)
+
 def extract_heading_styles_from_template(template_path: str = "templates/default.json") -> List[str]:
     """
     从指定的模板JSON文件中提取包含“标题”的样式名称，并按级别排序。
@@ -111,20 +132,29 @@ def extract_heading_styles_from_template(template_path: str = "templates/default
     Returns:
         排序后的标题样式名称列表。如果出错或未找到，则返回默认列表的副本。
     """
-    heading_styles = []
+    # 按 (路径, 修改时间) 缓存解析结果，文件被修改后自动重新读取
     try:
-        # 检查模板文件是否存在
-        if not os.path.exists(template_path):
-            print(f"警告: 模板配置文件 {template_path} 未找到。将使用默认列表。")
-            return DEFAULT_HEADING_STYLES[:] # 返回副本
+        mtime_ns = os.stat(template_path).st_mtime_ns
+    except FileNotFoundError:
+        print(f"警告: 模板配置文件 {template_path} 未找到。将使用默认列表。")
+        return DEFAULT_HEADING_STYLES[:] # 返回副本
+    except OSError as e:
+        print(f"警告: 从模板提取标题样式时发生意外错误: {e}。将使用默认列表。")
+        return DEFAULT_HEADING_STYLES[:] # 返回副本
+    return list(_extract_heading_styles_cached(template_path, mtime_ns)) # 返回副本
 
+@functools.lru_cache(maxsize=8)
+def _extract_heading_styles_cached(template_path: str, mtime_ns: int) -> tuple:
+    """extract_heading_styles_from_template 的实际实现，返回不可变的元组供缓存共享。"""
+    heading_styles = []
+    try:
         with open(template_path, 'r', encoding='utf-8') as f:
             template_config = json.load(f)
 
             # 检查 JSON 结构是否符合预期
             if "样式" not in template_config or not isinstance(template_config["样式"], dict):
                 print(f"警告: 在 {template_path} 中未找到有效的 '样式' 字典。将使用默认列表。")
-                return DEFAULT_HEADING_STYLES[:] # 返回副本
+                return tuple(DEFAULT_HEADING_STYLES)
 
             # 提取包含“标题”的样式名称
             heading_styles = [
@@ -135,40 +165,21 @@ def extract_heading_styles_from_template(template_path: str = "templates/default
             # 如果没有提取到任何标题样式
             if not heading_styles:
                 print(f"警告: 未能从 {template_path} 提取到任何包含'标题'的样式。将使用默认列表。")
-                return DEFAULT_HEADING_STYLES[:] # 返回副本
-
-            # 定义排序函数，按标题级别排序
-            def get_heading_level(style_name):
-                # 尝试匹配中文数字 "标题一", "标题二", ...
-                match_cn = re.search(r'标题([一二三四五六七八九])', style_name)
-                if match_cn:
-                    num_map = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
-                    return num_map.get(match_cn.group(1), 99) # 默认值设为较大数
-
-                # 尝试匹配阿拉伯数字 "标题1", "标题2", ...
-                match_num = re.search(r'标题(\d+)', style_name)
-                if match_num:
-                    try:
-                        return int(match_num.group(1))
-                    except ValueError:
-                        return 99 # 如果数字转换失败
-
-                # 如果两种模式都匹配不上，返回一个较大的默认值，使其排在后面
-                return 99
-
-            # 应用排序
-            heading_styles.sort(key=get_heading_level)
+                return tuple(DEFAULT_HEADING_STYLES)
+
+            # 应用排序，按标题级别排序
+            heading_styles.sort(key=_get_heading_level)
 
     except json.JSONDecodeError:
         print(f"警告: 模板配置文件 {template_path} 格式错误。将使用默认列表。")
-        return DEFAULT_HEADING_STYLES[:] # 返回副本
+        return tuple(DEFAULT_HEADING_STYLES)
     except Exception as e:
         # 捕获其他可能的异常，例如读取文件时的权限问题等
         print(f"警告: 从模板提取标题样式时发生意外错误: {e}。将使用默认列表。")
-        return DEFAULT_HEADING_STYLES[:] # 返回副本
+        return tuple(DEFAULT_HEADING_STYLES)
 
     # 最终返回提取并排序后的列表
-    return heading_styles
+    return tuple(heading_styles)
 
 # --- Functions moved from format_comparator.py ---
 
@@ -178,34 +189,49 @@ def _number_to_chinese(num: int) -> str:
     return chinese_map.get(num, str(num))
 
 
+# Basic check for CJK Unified Ideographs (U+4E00-U+9FFF), Hangul Syllables (U+AC00-U+D7AF),
+# Hiragana (U+3040-U+309F), Katakana (U+30A0-U+30FF). More comprehensive ranges can be added if needed.
+_EAST_ASIAN_RE = re.compile('[\u4e00-\u9fff\uac00-\ud7af\u3040-\u309f\u30a0-\u30ff]')
+
 def _is_primarily_east_asian(text: str) -> bool:
     """Checks if the text contains a significant portion of East Asian characters."""
-    if not text:
+    if not text or text.isascii():
+        # Empty or pure-ASCII text has no East Asian characters; isascii() is a cheap C-level check
         return False
-    east_asian_count = 0
-    total_count = 0
-    # Basic check for CJK Unified Ideographs, Hangul Syllables, Hiragana, Katakana
-    # More comprehensive ranges can be added if needed.
-    for char in text:
-        total_count += 1
-        # CJK Unified Ideographs U+4E00 to U+9FFF
-        if '\u4e00' <= char <= '\u9fff':
-            east_asian_count += 1
-        # Hangul Syllables U+AC00 to U+D7AF
-        elif '\uac00' <= char <= '\ud7af':
-            east_asian_count += 1
-        # Hiragana U+3040 to U+309F
-        elif '\u3040' <= char <= '\u309f':
-            east_asian_count += 1
-        # Katakana U+30A0 to U+30FF
-        elif '\u30a0' <= char <= '\u30ff':
-            east_asian_count += 1
+    # Counted as len(text) minus what is left after deleting the East Asian characters (both done in C)
+    east_asian_count = len(text) - len(_EAST_ASIAN_RE.sub('', text))
+    total_count = len(text)
 
     # Heuristic: If more than 30% are East Asian characters, consider it primarily East Asian
     # This threshold might need adjustment based on typical content.
     return total_count > 0 and (east_asian_count / total_count) > 0.3
 
 
+def _normalize_text_impl(text: str, NORM_FORM) -> str:
+    """normalize_text 的实际实现（text 已确保为 str）。"""
+    # 1. (可选) Unicode 规范化
+    if NORM_FORM and not text.isascii():
+        # 纯 ASCII 文本在 NFC/NFD/NFKC/NFKD 下均保持不变，可跳过 Unicode 表查找
+        text = unicodedata.normalize(NORM_FORM, text)
+
+    # 2. 字符规范化 (自定义数学符号等)
+    math_chars, math_trans = _math_char_table(NORM_FORM)
+    if not math_chars.isdisjoint(text):
+        text = text.translate(math_trans)
+
+    # 3. 移除 [FORMULA:] 标记
+    if '[FORMULA:]' in text:
+        text = _FORMULA_RE.sub(_formula_repl, text)
+
+    # 4./5. 合并连续空白（包括因上述替换产生的多余空格）并去除首尾空白；'\r'、'\n' 也属于空白，
+    #    会在这一步直接变为单个空格，无需先单独统一换行符。str.split() 与 re 的 \s 使用同一套 Unicode 空白定义
+    return ' '.join(text.split())
+
+# 样式名、单位、短标题等短文本会被反复规范化，结果按 (text, NORM_FORM) 缓存；
+# 长段落基本不重复，不进缓存以免占用大量内存
+_NORMALIZE_CACHE_MAX_LEN = 256
+_normalize_text_cached = functools.lru_cache(maxsize=8192)(_normalize_text_impl)
+
 def normalize_text(text: str, NORM_FORM='NFKC') -> str: # Added NORM_FORM parameter
     """
     规范化文本以便比较：
@@ -213,34 +239,11 @@ def normalize_text(text: str, NORM_FORM='NFKC') -> str: # Added NORM_FORM parame
     2. (可选) Unicode 规范化 (例如 NFKC)。
     3. 对数学字母数字符号等进行自定义规范化。
     4. 移除特殊的 "[FORMULA:]" 标记及其两侧可能的空格。
-    5. 将所有类型的换行符统一为 '\n'。
-    6. 将连续的内部空白字符（包括空格、制表符、换行符）替换为单个空格。
-    7. 去除首尾空白。
+    5. 将连续的内部空白字符（包括空格、制表符、各类换行符）替换为单个空格。
+    6. 去除首尾空白。
     """
     if not isinstance(text, str):
         text = str(text)
-
-    # 1. (可选) Unicode 规范化
-    if NORM_FORM:
-        text = unicodedata.normalize(NORM_FORM, text)
-
-    # 2. 字符规范化 (自定义数学符号等)
-    normalized_char_list = []
-    for char_in_text in text:
-        normalized_char_list.append(MATH_CHAR_NORM_MAP.get(char_in_text, char_in_text))
-    text = "".join(normalized_char_list)
-
-    # 3. 移除 [FORMULA:] 标记
-    text = text.replace(" [FORMULA:] ", " ")
-    text = text.replace("[FORMULA:] ", " ")
-    text = text.replace(" [FORMULA:]", " ")
-    text = text.replace("[FORMULA:]", "")
-
-    # 4. 统一换行符
-    text = text.replace('\r\n', '\n').replace('\r', '\n')
-    
-    # 5. 合并连续空白（包括因上述替换产生的多余空格）
-    text = re.sub(r'\s+', ' ', text)
-    
-    # 6. 最后去除首尾空白
-    return text.strip()
\ No newline at end of file
+    if len(text) <= _NORMALIZE_CACHE_MAX_LEN:
+        return _normalize_text_cached(text, NORM_FORM)
+    return _normalize_text_impl(text, NORM_FORM)